@@ -31,6 +31,12 @@ if is_darwin:
     a.datas = a.datas + [('sakia/data/repositories/meta.sql', 'src/sakia/data/repositories/meta.sql', 'DATA')]
     a.datas = a.datas + [('sakia/data/repositories/000_add_ud_rythm_parameters.sql',
                           'src/sakia/data/repositories/000_add_ud_rythm_parameters.sql', 'DATA')]
+    a.datas = a.datas + [('sakia/data/repositories/001_add_nodes_health.sql',
+                          'src/sakia/data/repositories/001_add_nodes_health.sql', 'DATA')]
+    a.datas = a.datas + [('sakia/data/repositories/002_add_block_headers.sql',
+                          'src/sakia/data/repositories/002_add_block_headers.sql', 'DATA')]
+    a.datas = a.datas + [('sakia/data/repositories/003_add_nodes_last_success.sql',
+                          'src/sakia/data/repositories/003_add_nodes_last_success.sql', 'DATA')]
     a.datas = a.datas + [('sakia/root_servers.yml', 'src/sakia/root_servers.yml', 'DATA')]
 
 if is_linux:
@@ -45,6 +51,12 @@ if is_linux:
     a.datas = a.datas + [('sakia/data/repositories/meta.sql', 'src/sakia/data/repositories/meta.sql', 'DATA')]
     a.datas = a.datas + [('sakia/data/repositories/000_add_ud_rythm_parameters.sql',
                           'src/sakia/data/repositories/000_add_ud_rythm_parameters.sql', 'DATA')]
+    a.datas = a.datas + [('sakia/data/repositories/001_add_nodes_health.sql',
+                          'src/sakia/data/repositories/001_add_nodes_health.sql', 'DATA')]
+    a.datas = a.datas + [('sakia/data/repositories/002_add_block_headers.sql',
+                          'src/sakia/data/repositories/002_add_block_headers.sql', 'DATA')]
+    a.datas = a.datas + [('sakia/data/repositories/003_add_nodes_last_success.sql',
+                          'src/sakia/data/repositories/003_add_nodes_last_success.sql', 'DATA')]
     a.datas = a.datas + [('sakia/root_servers.yml', 'src/sakia/root_servers.yml', 'DATA')]
 
 if is_win:
@@ -52,6 +64,12 @@ if is_win:
     a.datas = a.datas + [('sakia\\data\\repositories\\meta.sql', 'src\\sakia\\data\\repositories\\meta.sql', 'DATA')]
     a.datas = a.datas + [('sakia\\data\\repositories\\000_add_ud_rythm_parameters.sql',
                           'src\\sakia\\data\\repositories\\000_add_ud_rythm_parameters.sql', 'DATA')]
+    a.datas = a.datas + [('sakia\\data\\repositories\\001_add_nodes_health.sql',
+                          'src\\sakia\\data\\repositories\\001_add_nodes_health.sql', 'DATA')]
+    a.datas = a.datas + [('sakia\\data\\repositories\\002_add_block_headers.sql',
+                          'src\\sakia\\data\\repositories\\002_add_block_headers.sql', 'DATA')]
+    a.datas = a.datas + [('sakia\\data\\repositories\\003_add_nodes_last_success.sql',
+                          'src\\sakia\\data\\repositories\\003_add_nodes_last_success.sql', 'DATA')]
     a.datas = a.datas + [('sakia\\root_servers.yml', 'src\\/sakia\\root_servers.yml', 'DATA')]
 
 
@@ -10,11 +10,12 @@ from .options import SakiaOptions
 from sakia.data.connectors import BmaConnector
 from sakia.services import NetworkService, BlockchainService, IdentitiesService, \
     SourcesServices, TransactionsService, DocumentsService
-from sakia.data.repositories import SakiaDatabase
+from sakia.data.repositories import SakiaDatabase, NodesRegistry
 from sakia.data.entities import Transaction, Connection, Identity, Dividend
 from sakia.data.processors import BlockchainProcessor, NodesProcessor, IdentitiesProcessor, \
     CertificationsProcessor, SourcesProcessor, TransactionsProcessor, ConnectionsProcessor, DividendsProcessor
 from sakia.data.files import AppDataFile, UserParametersFile
+from sakia.data.parser import DocumentsParser
 from sakia.decorators import asyncify
 from sakia.money import *
 import asyncio
@@ -41,6 +42,9 @@ class Application(QObject):
     :param sakia.services.SourcesService sources_service: All sources services for current currency
     :param sakia.Services.TransactionsService transactions_service: All transactions services for current currency
     :param sakia.services.DocumentsService documents_service: A service to broadcast documents
+    :param sakia.data.connectors.BmaConnector bma_connector: The connector to BMA API shared by all processors
+    :param sakia.data.parser.DocumentsParser documents_parser: The documents parser shared by all processors
+    :param sakia.data.repositories.NodesRegistry nodes_registry: The known nodes, shared by all processors
     """
 
     new_dividend = pyqtSignal(Dividend)
@@ -52,6 +56,7 @@ class Application(QObject):
     sources_refreshed = pyqtSignal()
     new_blocks_handled = pyqtSignal()
     view_in_wot = pyqtSignal(Connection, Identity)
+    document_broadcasted = pyqtSignal(str, str, list)
 
     qapp = attr.ib()
     loop = attr.ib()
@@ -66,6 +71,9 @@ class Application(QObject):
     sources_service = attr.ib(default=None)
     transactions_service = attr.ib(default=None)
     documents_service = attr.ib(default=None)
+    bma_connector = attr.ib(default=None)
+    documents_parser = attr.ib(default=attr.Factory(DocumentsParser))
+    nodes_registry = attr.ib(default=None)
     current_ref = attr.ib(default=Quantitative)
     _logger = attr.ib(default=attr.Factory(lambda:logging.getLogger('sakia')))
     available_version = attr.ib(init=False)
@@ -75,6 +83,7 @@ class Application(QObject):
         super().__init__()
         self._translator = QTranslator(self.qapp)
         self.available_version = True, __version__, ""
+        self.document_broadcasted.connect(self.handle_document_broadcasted)
 
     @classmethod
     def startup(cls, argv, qapp, loop):
@@ -102,8 +111,12 @@ class Application(QObject):
         self.instanciate_services()
 
     def instanciate_services(self):
-        nodes_processor = NodesProcessor(self.db.nodes_repo)
-        bma_connector = BmaConnector(nodes_processor, self.parameters)
+        self.nodes_registry = NodesRegistry(self.db.nodes_repo)
+        self.nodes_registry.load()
+        nodes_processor = NodesProcessor(self.nodes_registry)
+        self.bma_connector = BmaConnector(nodes_processor, self.parameters,
+                                          broadcast_finished=self.document_broadcasted.emit)
+        bma_connector = self.bma_connector
         connections_processor = ConnectionsProcessor(self.db.connections_repo)
         identities_processor = IdentitiesProcessor(self.db.identities_repo, self.db.blockchains_repo, bma_connector)
         certs_processor = CertificationsProcessor(self.db.certifications_repo, self.db.identities_repo, bma_connector)
@@ -123,7 +136,7 @@ class Application(QObject):
         self.transactions_service = TransactionsService(self.currency, transactions_processor,
                                                                    dividends_processor,
                                                                    identities_processor, connections_processor,
-                                                                   bma_connector)
+                                                                   bma_connector, self.documents_parser)
 
         self.sources_service = SourcesServices(self.currency, sources_processor,
                                                connections_processor, transactions_processor,
@@ -156,6 +169,7 @@ class Application(QObject):
         if not connections_processor.connections():
             NodesProcessor.instanciate(self).drop_all(self.currency)
 
+        self.nodes_registry.flush()
         self.db.commit()
         self.start_coroutines()
 
@@ -175,6 +189,19 @@ class Application(QObject):
         else:
             self._logger.debug("Couldn't load i18n/{0}".format(locale))
 
+    def handle_document_broadcasted(self, currency, request_name, results):
+        """
+        Report the nodes which rejected a broadcasted document, their replies
+        being received after the document was accepted by another node
+        :param str currency: the currency of the document
+        :param str request_name: the name of the bma request
+        :param list results: the pubkey of each node and its http status, or the error it raised
+        """
+        rejections = [(pubkey[:5], result) for pubkey, result in results if result != 200]
+        if rejections:
+            self._logger.warning("{0} of {1} rejected by {2} nodes : {3}".format(request_name, currency,
+                                                                             len(rejections), rejections))
+
     def start_coroutines(self):
         self.network_service.start_coroutines()
 
@@ -184,6 +211,10 @@ class Application(QObject):
         and stop the coroutines
         """
         await self.network_service.stop_coroutines(closing)
+        await self.bma_connector.close()
+        self.documents_parser.shutdown()
+        self.nodes_registry.flush()
+        self.db.commit()
 
     @asyncify
     async def get_last_version(self):
@@ -0,0 +1,208 @@
+"""
+Crawls the network of a currency without the graphical interface,
+and prints the metrics of the crawling in json :
+
+    python -m sakia.crawl --currency g1 --duration 120
+    python -m sakia.crawl --currency g1 --nodes g1.duniter.org:443 --secured
+    python -m sakia.crawl --mirage --until-stable
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import signal
+import sys
+import time
+from optparse import OptionParser
+
+import attr
+from PyQt5.QtCore import QCoreApplication
+from quamash import QSelectorEventLoop
+
+from sakia.app import Application
+from sakia.constants import ROOT_SERVERS
+from sakia.data.connectors import NodeConnector
+from sakia.data.entities import Node
+from sakia.data.files import AppDataFile, UserParametersFile
+from sakia.data.processors import BlockchainProcessor
+from sakia.data.repositories import SakiaDatabase
+from sakia.options import SakiaOptions
+
+# Currency of the local mirage server
+MIRAGE_CURRENCY = "test_currency"
+
+
+@attr.s()
+class CrawlMetrics:
+    """
+    The metrics of a crawling.
+    The consensus is stable once the majority kept the same block during stable_delay seconds.
+    """
+    start = attr.ib()
+    stable_delay = attr.ib()
+    nodes_found = attr.ib(default=0)
+    majority = attr.ib(default=None)
+    majority_since = attr.ib(default=None)
+    # Seconds from the start to the first majority which stayed stable
+    stable_after = attr.ib(default=None)
+    # Seconds spent initializing the blockchain, if it was synchronized
+    sync_initialization = attr.ib(default=None)
+
+    def node_found(self, node=None):
+        self.nodes_found += 1
+
+    def observe(self, majority, now):
+        """
+        Observe the block of the majority
+        :param str majority: the hash of the block of the majority
+        :param float now: the current time
+        """
+        if majority != self.majority:
+            self.majority = majority
+            self.majority_since = now
+        elif majority and self.stable_after is None and now - self.majority_since >= self.stable_delay:
+            self.stable_after = self.majority_since - self.start
+
+    def stable(self):
+        return self.stable_after is not None
+
+    def report(self, now, traffic, known_nodes, online_nodes):
+        """
+        Get the metrics
+        :param float now: the current time
+        :param sakia.data.connectors.traffic.TrafficStats traffic: the traffic of the crawling
+        :param int known_nodes: the number of known nodes
+        :param int online_nodes: the number of online nodes
+        :rtype: dict
+        """
+        elapsed = now - self.start
+        return {
+            "duration": round(elapsed, 3),
+            "nodes_known": known_nodes,
+            "nodes_online": online_nodes,
+            "nodes_discovered": self.nodes_found,
+            "nodes_discovered_per_second": round(self.nodes_found / elapsed, 3) if elapsed else 0,
+            "requests": traffic.requests,
+            "ws_messages": traffic.ws_messages,
+            "bytes_received": traffic.bytes_received,
+            "majority_block": self.majority,
+            "time_to_stable_consensus": round(self.stable_after, 3) if self.stable() else None,
+            "sync_initialization": round(self.sync_initialization, 3) if self.sync_initialization else None
+        }
+
+
+def parse_arguments(argv):
+    parser = OptionParser()
+    parser.add_option("--currency", dest="currency", default="g1",
+                      help="Select a currency between {0}".format(",".join(ROOT_SERVERS.keys())))
+    parser.add_option("--profile", dest="profile", default="crawler",
+                      help="The profile storing the crawled nodes")
+    parser.add_option("--nodes", dest="nodes", default="",
+                      help="Comma separated address:port of the nodes to start from, instead of the root nodes")
+    parser.add_option("--secured", action="store_true", dest="secured", default=False,
+                      help="Use https to contact the given nodes")
+    parser.add_option("--mirage", action="store_true", dest="mirage", default=False,
+                      help="Crawl a local mirage server")
+    parser.add_option("--sync", action="store_true", dest="sync", default=False,
+                      help="Initialize the blockchain and synchronize it during the crawling")
+    parser.add_option("--duration", dest="duration", type="float", default=60,
+                      help="Seconds of crawling")
+    parser.add_option("--stable", dest="stable", type="float", default=10,
+                      help="Seconds the majority must keep the same block to be stable")
+    parser.add_option("--until-stable", action="store_true", dest="until_stable", default=False,
+                      help="Stop as soon as the consensus is stable")
+    parser.add_option("-d", "--debug", action="store_true", dest="debug", default=False,
+                      help="Print DEBUG messages to stderr")
+    options, args = parser.parse_args(argv)
+    if options.mirage:
+        ROOT_SERVERS[MIRAGE_CURRENCY] = {'display': "Mirage", 'nodes': {}}
+        options.currency = MIRAGE_CURRENCY
+    elif options.currency not in ROOT_SERVERS.keys():
+        raise RuntimeError("{0} is not a valid currency".format(options.currency))
+    return options
+
+
+async def seed_nodes(options, parameters, loop):
+    """
+    Get the nodes the crawling starts from
+    :return: the nodes, and the mirage server if one was started
+    :rtype: (list[sakia.data.entities.Node], mirage.Node)
+    """
+    if options.mirage:
+        import mirage
+        server = await mirage.Node.start(None, MIRAGE_CURRENCY, "12356", "123456", loop)
+        server.forge.forge_block()
+        peer = server.peer_doc()
+        return [Node(currency=server.forge.currency, pubkey=server.forge.key.pubkey, endpoints=peer.endpoints,
+                     peer_blockstamp=peer.blockUID, state=Node.ONLINE)], server
+    nodes = []
+    for address in [a for a in options.nodes.split(",") if a]:
+        host, port = address.rsplit(":", 1)
+        connector = await NodeConnector.from_address(options.currency, options.secured, host, int(port), parameters)
+        await connector.session.close()
+        connector.node.state = Node.ONLINE
+        nodes.append(connector.node)
+    return nodes, None
+
+
+async def crawl(app, options, metrics):
+    """
+    Crawl until the duration is reached, or until the consensus is stable if requested
+    """
+    if options.sync:
+        start = time.monotonic()
+        await BlockchainProcessor.instanciate(app).initialize_blockchain(options.currency, logging.debug)
+        app.db.commit()
+        metrics.sync_initialization = time.monotonic() - start
+    app.network_service.new_node_found.connect(metrics.node_found)
+    app.start_coroutines()
+    while time.monotonic() - metrics.start < options.duration:
+        await asyncio.sleep(0.5)
+        metrics.observe(app.network_service.majority_block(), time.monotonic())
+        if options.until_stable and metrics.stable():
+            break
+
+
+def main(argv):
+    options = parse_arguments(argv)
+    logging.basicConfig(stream=sys.stderr, level=logging.DEBUG if options.debug else logging.WARNING)
+    qapp = QCoreApplication(argv)
+    loop = QSelectorEventLoop(qapp)
+    asyncio.set_event_loop(loop)
+
+    with loop:
+        sakia_options = SakiaOptions(currency=options.currency)
+        app_data = AppDataFile.in_config_path(sakia_options.config_path).load_or_init()
+        parameters = UserParametersFile.in_config_path(sakia_options.config_path, options.profile).load_or_init()
+        db = SakiaDatabase.load_or_init(sakia_options, options.profile)
+        app = Application(qapp, loop, sakia_options, app_data, parameters, db, options.currency)
+
+        nodes, server = loop.run_until_complete(seed_nodes(options, parameters, loop))
+        for node in nodes:
+            if db.nodes_repo.get_one(currency=node.currency, pubkey=node.pubkey):
+                db.nodes_repo.update(node)
+            else:
+                db.nodes_repo.insert(node)
+        db.commit()
+        app.instanciate_services()
+
+        metrics = CrawlMetrics(time.monotonic(), options.stable)
+        try:
+            loop.run_until_complete(crawl(app, options, metrics))
+        finally:
+            nodes = app.network_service.nodes()
+            report = metrics.report(time.monotonic(), app.bma_connector.traffic, len(nodes),
+                                    len([n for n in nodes if n.state == Node.ONLINE]))
+            report["sync"] = [dict(attr.asdict(m), throughput=m.throughput())
+                              for m in app.blockchain_service.sync_metrics()]
+            loop.run_until_complete(app.stop_current_profile())
+            if server:
+                loop.run_until_complete(server.close())
+        print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    # documents are parsed in child processes, which must not start the crawler when frozen
+    multiprocessing.freeze_support()
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    main(sys.argv)
@@ -4,13 +4,36 @@ from aiohttp.errors import ClientError, ServerDisconnectedError
 from duniterpy.api import bma, errors
 from duniterpy.documents import BMAEndpoint, SecuredBMAEndpoint
 from sakia.errors import NoPeerAvailable
+from .cache import ResponsesCache
+from .scores import Scoreboard
+from .limiter import RateLimiter, BURST
+from .traffic import TrafficStats
 from pkg_resources import parse_version
 from socket import gaierror
 import asyncio
+import itertools
 import random
+import time
 import jsonschema
 import attr
-import copy
+
+# Number of connections kept acquired by the websockets listening to a node, for its blocks and its peers
+WEBSOCKETS_PER_HOST = 2
+# Maximum number of simultaneous connections kept to the same node
+# The websockets do not take the connections of the requests, as many as a burst of requests
+CONNECTIONS_PER_HOST = WEBSOCKETS_PER_HOST + BURST
+# Seconds an idle keep-alive connection is kept in the pool
+KEEPALIVE_TIMEOUT = 60
+# Seconds between two saves of the nodes scores in the database
+SCORES_SAVE_DELAY = 60
+# Seconds to wait for the quorum of a verified request before requesting one more node
+HEDGING_DELAY = 2
+
+# Fields which can differ between synced nodes answers
+VOLATILE_FIELDS = {
+    bma.tx.history: frozenset(("sending", "receiving", "pending")),
+    bma.wot.requirements: frozenset(("expiresIn", "membershipPendingExpiresIn"))
+}
 
 
 async def parse_responses(responses):
@@ -37,6 +60,26 @@ async def parse_responses(responses):
                 result = (False, str(e))
     return result
 
+
+def _reply(future):
+    """
+    Get the reply of a finished broadcast request
+    :param asyncio.Future future: the request
+    :return: the aiohttp reply, or the exception raised
+    """
+    return future.exception() or future.result()
+
+
+def _accepted(future):
+    """
+    Check if a finished broadcast request was accepted by the node
+    :param asyncio.Future future: the request
+    :rtype: bool
+    """
+    reply = _reply(future)
+    return not isinstance(reply, BaseException) and reply.status == 200
+
+
 def filter_endpoints(request, nodes):
     def compare_versions(node, version):
         if node.version and node.version != '':
@@ -59,24 +102,22 @@ def filter_endpoints(request, nodes):
     return endpoints
 
 
-def make_hash(o):
-    """
-    Makes a hash from a dictionary, list, tuple or set to any level, that contains
-    only other hashable types (including any lists, tuples, sets, and
-    dictionaries).
+def canonical_digest(o, volatile=frozenset()):
     """
+    Makes a hash from json data in a single pass, without copying it.
+    Dictionaries keys order and lists order are not taken into account.
 
-    if isinstance(o, (set, tuple, list)):
-        return tuple(sorted([make_hash(e) for e in o]))
-    elif not isinstance(o, dict):
+    :param o: the json data
+    :param set volatile: the keys of the dictionaries, at any level, which are not hashed
+    :rtype: int
+    """
+    if isinstance(o, dict):
+        return hash(frozenset((k, canonical_digest(v, volatile)) for k, v in o.items() if k not in volatile))
+    elif isinstance(o, list):
+        return hash(tuple(sorted(canonical_digest(e, volatile) for e in o)))
+    else:
         return hash(o)
 
-    new_o = copy.deepcopy(o)
-    for k, v in new_o.items():
-        new_o[k] = make_hash(v)
-
-    return hash(tuple(frozenset(sorted(new_o.items()))))
-
 
 def _compare_json(first, second):
     """
@@ -104,23 +145,6 @@ def _compare_json(first, second):
     return ordered(first) == ordered(second)
 
 
-def _filter_data(request, data):
-    filtered = data
-    if request is bma.tx.history:
-        filtered = copy.deepcopy(data)
-        filtered["history"].pop("sending")
-        filtered["history"].pop("receiving")
-        filtered["history"].pop("pending")
-    elif request is bma.wot.requirements:
-        filtered = copy.deepcopy(data)
-        for idty in filtered["identities"]:
-            for c in idty["certifications"]:
-                c.pop("expiresIn")
-            idty.pop('membershipPendingExpiresIn')
-
-    return filtered
-
-
 def _merge_lookups(answers_data):
     if len(answers_data) == 1:
         data = next((v for v in answers_data.values()))
@@ -162,60 +186,177 @@ class BmaConnector:
     _nodes_processor = attr.ib()
     _user_parameters = attr.ib()
     _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
+    # Called with the currency, the request name and the (pubkey, status) of each node when a broadcast ends
+    _broadcast_finished = attr.ib(default=None)
+    _session = attr.ib(default=None, init=False)
+    _cache = attr.ib(default=attr.Factory(ResponsesCache), init=False)
+    _in_flight = attr.ib(default=attr.Factory(dict), init=False)
+    _scores = attr.ib(default=attr.Factory(Scoreboard), init=False)
+    _limiter = attr.ib(default=attr.Factory(RateLimiter), init=False)
+    _scores_saved = attr.ib(default=attr.Factory(time.time), init=False)
+    traffic = attr.ib(default=attr.Factory(TrafficStats), init=False)
+
+    def session(self):
+        """
+        Get the pooled session shared by every request of this connector.
+        Connections are kept alive between requests and DNS resolutions are cached,
+        and the traffic is counted.
+        The session is created lazily, and created again if it was closed.
+        :rtype: aiohttp.ClientSession
+        """
+        if not self._session or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=CONNECTIONS_PER_HOST,
+                                             use_dns_cache=True,
+                                             keepalive_timeout=KEEPALIVE_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, **self.traffic.session_classes())
+        return self._session
+
+    def cache_stats(self):
+        """
+        Get the hit and miss counters of the verified answers cache
+        :return: the number of hits, misses, and the cache size in bytes
+        :rtype: tuple
+        """
+        return self._cache.hits, self._cache.misses, self._cache.size
+
+    def save_scores(self):
+        """
+        Save the changed nodes scores in the database
+        """
+        for currency, pubkey, score in self._scores.pop_changed():
+            self._nodes_processor.update_health(currency, pubkey, score.latency,
+                                                score.error_rate, score.last_limitation)
+        self._scores_saved = time.time()
+
+    def score(self, node):
+        """
+        Get the current health score of a node, measured from the requests sent to it
+        :param sakia.data.entities.Node node: the node
+        :rtype: sakia.data.connectors.scores.Score
+        """
+        return self._scores.score(node)
+
+    def ordered_nodes(self, request, nodes):
+        """
+        Get the nodes able to answer a request, the healthiest and fastest having more chances to come first.
+        Nodes which already received too many requests come last.
+        :param request: the bma request
+        :param list[sakia.data.entities.Node] nodes: the nodes
+        :rtype: list[sakia.data.entities.Node]
+        """
+        nodes = self._scores.order([n for n in nodes if filter_endpoints(request, [n])])
+        available = [n for n in nodes if self._limiter.available(n)]
+        throttled = [n for n in nodes if n not in available]
+        return available + throttled
+
+    async def _request(self, node, request, req_args):
+        """
+        Send a request to one of the endpoints of a node, and record the node health
+        :param sakia.data.entities.Node node: the node
+        :param request: the bma request
+        :param dict req_args: Arguments to pass to the request constructor
+        :return: the returned data
+        """
+        endpoint = random.choice(filter_endpoints(request, [node]))
+        await self._limiter.acquire(node)
+        self._logger.debug("Requesting {0} on endpoint {1}".format(str(request.__name__), str(endpoint)))
+        start = time.monotonic()
+        try:
+            conn_handler = next(endpoint.conn_handler(self.session(), proxy=self._user_parameters.proxy()))
+            data = await request(conn_handler, **req_args)
+        except asyncio.CancelledError:
+            raise
+        except errors.DuniterError as e:
+            if e.ucode == errors.HTTP_LIMITATION:
+                self._scores.limitation(node)
+                self._limiter.limitation(node)
+            else:
+                self._scores.success(node, (time.monotonic() - start) * 1000)
+                self._limiter.success(node)
+            raise
+        except Exception:
+            self._scores.failure(node)
+            raise
+        self._scores.success(node, (time.monotonic() - start) * 1000)
+        self._limiter.success(node)
+        if time.time() - self._scores_saved > SCORES_SAVE_DELAY:
+            self.save_scores()
+        return data
+
+    async def close(self):
+        """
+        Save the nodes scores, and close the pooled session and all its connections
+        """
+        self.save_scores()
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
     async def verified_get(self, currency, request, req_args):
+        """
+        Get data agreed by a quorum of nodes.
+        Answers are compared as soon as they arrive, and the requests still pending
+        are cancelled when the quorum is reached. Other nodes are only requested
+        to replace failing or disagreeing nodes, or when the quorum is not reached in time.
+
+        :param str currency: the currency requested
+        :param class request: A bma request class calling for data
+        :param dict req_args: Arguments to pass to the request constructor
+        :return: The returned data
+        """
         synced_nodes = self._nodes_processor.synced_members_nodes(currency)
         if not synced_nodes:
             # If no node is known as a member, lookup synced nodes as a fallback
             synced_nodes = self._nodes_processor.synced_nodes(currency)
-        nodes_generator = (n for n in synced_nodes)
+        nodes_generator = (n for n in self.ordered_nodes(request, synced_nodes))
         answers = {}
         answers_data = {}
-        nb_verification = min(max(1, 0.66 * len(synced_nodes)), 10)
         # We try to find agreeing nodes from one 1 to 66% of nodes, max 10
-        session = aiohttp.ClientSession()
-        filtered_data = {}
-        try:
-            while max([len(nodes) for nodes in answers.values()] + [0]) <= nb_verification:
-                futures = []
+        nb_verification = min(max(1, 0.66 * len(synced_nodes)), 10)
+        quorum = int(nb_verification) + 1
+        requested_nodes = {}
+        pending = set()
 
-                try:
-                    for i in range(0, int(nb_verification)+1):
-                        node = next(nodes_generator)
-                        endpoints = filter_endpoints(request, [node])
-                        endpoint = random.choice(endpoints)
-                        self._logger.debug(
-                            "Requesting {0} on endpoint {1}".format(str(request.__name__), str(endpoint)))
-                        futures.append(request(next(
-                            endpoint.conn_handler(session, proxy=self._user_parameters.proxy())),
-                            **req_args))
-                except StopIteration:
-                    # When no more node is available, we go out of the while loop
+        def request_nodes(count):
+            for node in itertools.islice(nodes_generator, max(count, 0)):
+                task = asyncio.ensure_future(self._request(node, request, req_args))
+                requested_nodes[task] = node
+                pending.add(task)
+
+        request_nodes(quorum)
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=HEDGING_DELAY, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The quorum is late, we request one more node
+                    request_nodes(1)
+                    continue
+                for task in done:
+                    pending.remove(task)
+                    node = requested_nodes.pop(task)
+                    try:
+                        r = task.result()
+                        data_hash = canonical_digest(r, VOLATILE_FIELDS.get(request, frozenset()))
+                    except errors.DuniterError as e:
+                        if e.ucode == errors.HTTP_LIMITATION:
+                            self._logger.debug("Exception in responses : " + e.message)
+                            continue
+                        r = e
+                        data_hash = hash(e.ucode)
+                    except Exception as e:
+                        self._logger.debug("Exception in responses : " + str(e))
+                        continue
+                    answers_data[data_hash] = r
+                    answers.setdefault(data_hash, []).append(node)
+
+                best_score = max([len(nodes) for nodes in answers.values()] + [0])
+                if best_score >= quorum:
                     break
-                finally:
-                    # Everytime we go out of the while loop, we gather the futures
-                    if futures:
-                        responses = await asyncio.gather(*futures, return_exceptions=True)
-                        for r in responses:
-                            if isinstance(r, errors.DuniterError):
-                                if r.ucode == errors.HTTP_LIMITATION:
-                                    self._logger.debug("Exception in responses : " + r.message)
-                                    continue
-                                else:
-                                    data_hash = hash(r.ucode)
-                            elif isinstance(r, BaseException):
-                                self._logger.debug("Exception in responses : " + str(r))
-                                continue
-                            else:
-                                filtered_data = _filter_data(request, r)
-                                data_hash = make_hash(filtered_data)
-                            answers_data[data_hash] = r
-                            if data_hash not in answers:
-                                answers[data_hash] = [node]
-                            else:
-                                answers[data_hash].append(node)
+                # Replace the nodes which failed or disagreed
+                request_nodes(quorum - best_score - len(pending))
         finally:
-            await session.close()
+            for task in pending:
+                task.cancel()
 
         if len(answers_data) > 0:
             if request is bma.wot.lookup:
@@ -226,16 +367,12 @@ class BmaConnector:
         raise NoPeerAvailable("", len(synced_nodes))
 
     async def simple_get(self, currency, request, req_args):
-        endpoints = filter_endpoints(request, self._nodes_processor.synced_nodes(currency))
+        nodes = self.ordered_nodes(request, self._nodes_processor.synced_nodes(currency))
         tries = 0
-        while tries < 3 and endpoints:
-            endpoint = random.choice(endpoints)
-            endpoints.remove(endpoint)
+        while tries < 3 and nodes:
+            node = nodes.pop(0)
             try:
-                self._logger.debug("Requesting {0} on endpoint {1}".format(str(request.__name__), str(endpoint)))
-                async with aiohttp.ClientSession() as session:
-                    json_data = await request(next(endpoint.conn_handler(session), **req_args))
-                    return json_data
+                return await self._request(node, request, req_args)
             except errors.DuniterError as e:
                 if e.ucode == errors.HTTP_LIMITATION:
                     self._logger.debug(str(e))
@@ -246,22 +383,92 @@ class BmaConnector:
                     asyncio.TimeoutError, ValueError, jsonschema.ValidationError) as e:
                 self._logger.debug(str(e))
                 tries += 1
-        raise NoPeerAvailable("", len(endpoints))
+        raise NoPeerAvailable("", len(nodes))
+
+    async def sharded_get(self, currency, request, req_args_list):
+        """
+        Send a request with different arguments to different synced nodes at the same time.
+        Answers are not verified against other nodes. A shard failing on a node is requested to the next one.
+
+        :param str currency: the currency requested
+        :param class request: A bma request class calling for data
+        :param list[dict] req_args_list: Arguments to pass to the request constructor, for each shard
+        :return: The returned data of each shard, or the exception raised by its last try
+        :rtype: list
+        """
+        nodes = self.ordered_nodes(request, self._nodes_processor.synced_nodes(currency))
+        if not nodes:
+            raise NoPeerAvailable("", len(nodes))
+        max_tries = min(3, len(nodes))
+
+        async def get_shard(index, req_args):
+            for tries in range(max_tries):
+                node = nodes[(index + tries) % len(nodes)]
+                try:
+                    return await self._request(node, request, req_args)
+                except errors.DuniterError as e:
+                    if e.ucode != errors.HTTP_LIMITATION or tries == max_tries - 1:
+                        raise
+                    self._logger.debug(str(e))
+                except (ClientError, ServerDisconnectedError, gaierror,
+                        asyncio.TimeoutError, ValueError, jsonschema.ValidationError) as e:
+                    if tries == max_tries - 1:
+                        raise
+                    self._logger.debug(str(e))
+
+        return await asyncio.gather(*[get_shard(i, args) for i, args in enumerate(req_args_list)],
+                                    return_exceptions=True)
 
     async def get(self, currency, request, req_args={}, verify=True):
         """
+        Identical requests sent at the same time are only sent once to the network,
+        every caller awaiting the same answer.
+
         :param str currency: the currency requested
         :param class request: A bma request class calling for data
         :param dict req_args: Arguments to pass to the request constructor
         :param bool verify: Verify returned value against multiple nodes
-        :return: The returned data
+        :return: The returned data. Verified data is cached until a new block is found and must not be modified.
         """
+        current_buid = None
         if verify:
-            return await self.verified_get(currency, request, req_args)
+            current_buid = self._nodes_processor.current_buid(currency)
+            data = self._cache.get(currency, request, req_args, current_buid)
+            if data is not None:
+                return data
+
+        key = (ResponsesCache.key(currency, request, req_args), verify)
+        task = self._in_flight.get(key)
+        if task:
+            self._logger.debug("Joining pending request {0}".format(str(request.__name__)))
+        else:
+            task = asyncio.ensure_future(self._get(currency, request, req_args, current_buid))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._request_done(key, t))
+        # A cancelled caller must not cancel the request shared with others
+        return await asyncio.shield(task)
+
+    def _request_done(self, key, task):
+        if self._in_flight.get(key) is task:
+            self._in_flight.pop(key)
+
+    async def _get(self, currency, request, req_args, current_buid):
+        """
+        Send a request to the network
+        :param str currency: the currency requested
+        :param class request: A bma request class calling for data
+        :param dict req_args: Arguments to pass to the request constructor
+        :param duniterpy.documents.BlockUID current_buid: the network block uid if the data must be verified, else None
+        :return: The returned data
+        """
+        if current_buid is not None:
+            data = await self.verified_get(currency, request, req_args)
+            self._cache.put(currency, request, req_args, current_buid, data)
+            return data
         else:
             return await self.simple_get(currency, request, req_args)
 
-    async def broadcast(self, currency, request, req_args={}):
+    async def broadcast(self, currency, request, req_args={}, first_accepted=False):
         """
         Broadcast data to a network.
         Sends the data to all knew nodes.
@@ -269,26 +476,65 @@ class BmaConnector:
         :param str currency: the currency target
         :param request: A duniterpy bma request class
         :param req_args: Arguments to pass to the request constructor
-        :return: All nodes replies
+        :param bool first_accepted: return as soon as a node accepted the data,
+        the other nodes replies are handled in the background
+        :return: All nodes replies, or the replies received until the first acceptance
         :rtype: tuple of aiohttp replies
 
         .. note:: If one node accept the requests (returns 200),
         the broadcast should be considered accepted by the network.
+        The final replies of all nodes are reported to the broadcast_finished callback.
         """
-        filtered_endpoints = filter_endpoints(request, self._nodes_processor.synced_nodes(currency))
-        endpoints = random.sample(filtered_endpoints, 6) if len(filtered_endpoints) > 6 else filtered_endpoints
-        replies = []
-
-        if len(endpoints) > 0:
-            with aiohttp.ClientSession() as session:
-                for endpoint in endpoints:
-                    self._logger.debug("Trying to connect to : " + str(endpoint))
-                    reply = asyncio.ensure_future(request(next(endpoint.conn_handler(session,
-                                                                                proxy=self._user_parameters.proxy())),
-                                                          **req_args))
-                    replies.append(reply)
-
-                result = await asyncio.gather(*replies, return_exceptions=True)
-                return tuple(result)
+        # The document may change the answers until the next block
+        self._cache.expire(currency)
+        nodes = self.ordered_nodes(request, self._nodes_processor.synced_nodes(currency))[:6]
+
+        if len(nodes) > 0:
+            replies = [asyncio.ensure_future(self._request(node, request, req_args)) for node in nodes]
+
+            if first_accepted:
+                pending = set(replies)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    if any(_accepted(r) for r in done):
+                        break
+                if pending:
+                    asyncio.ensure_future(self._complete_broadcast(currency, request, nodes, replies, pending))
+                    return tuple(_reply(r) for r in replies if r.done())
+            else:
+                await asyncio.wait(replies)
+
+            result = tuple(_reply(r) for r in replies)
+            self._broadcast_done(currency, request, nodes, result)
+            return result
         else:
-            raise NoPeerAvailable("", len(endpoints))
+            raise NoPeerAvailable("", len(nodes))
+
+    async def _complete_broadcast(self, currency, request, nodes, replies, pending):
+        """
+        Wait for the replies of a broadcast still pending after its acceptance
+        :param str currency: the currency target
+        :param request: the bma request
+        :param list[sakia.data.entities.Node] nodes: the nodes requested
+        :param list[asyncio.Future] replies: the requests sent to the nodes
+        :param set[asyncio.Future] pending: the requests still pending
+        """
+        await asyncio.wait(pending)
+        for r in pending:
+            reply = _reply(r)
+            if not isinstance(reply, BaseException):
+                await reply.release()
+        self._broadcast_done(currency, request, nodes, tuple(_reply(r) for r in replies))
+
+    def _broadcast_done(self, currency, request, nodes, replies):
+        """
+        Report the final replies of a broadcast
+        :param str currency: the currency target
+        :param request: the bma request
+        :param list[sakia.data.entities.Node] nodes: the nodes requested
+        :param tuple replies: the replies of the nodes
+        """
+        results = [(n.pubkey, str(r) if isinstance(r, BaseException) else r.status) for n, r in zip(nodes, replies)]
+        self._logger.debug("Broadcast of {0} : {1}".format(request.__name__, results))
+        if self._broadcast_finished:
+            self._broadcast_finished(currency, request.__name__, results)
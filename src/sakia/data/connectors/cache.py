@@ -0,0 +1,138 @@
+import attr
+import json
+import logging
+from collections import OrderedDict
+from duniterpy.api import bma
+
+# Number of blocks which can still be replaced by a fork resolution
+FORK_WINDOW = 100
+
+
+def _immutable_block(request, req_args):
+    """
+    Get the highest block number an immutable request concerns
+    :param request: the bma request
+    :param dict req_args: the request arguments
+    :return: the block number, or None if the answer changes with every new block
+    :rtype: int
+    """
+    if request is bma.blockchain.block and 'number' in req_args:
+        return req_args['number']
+    elif request is bma.blockchain.blocks:
+        return req_args['start'] + req_args['count'] - 1
+    elif request is bma.blockchain.parameters:
+        return 0
+    return None
+
+
+@attr.s()
+class CacheEntry:
+    data = attr.ib()
+    # The network block uid when the data was received
+    buid = attr.ib()
+    # The block concerned by an immutable answer, None if it expires on next block
+    block_number = attr.ib()
+    # Approximative size of the data in bytes
+    size = attr.ib()
+
+
+@attr.s()
+class ResponsesCache:
+    """
+    A LRU cache of verified BMA answers.
+
+    Answers are tagged with the network current block uid.
+    Answers concerning a given block are kept until a fork replaces the block,
+    other answers expire as soon as a new block is found.
+    The returned data is shared between callers and must not be modified.
+    """
+    max_size = attr.ib(default=16 * 1024 * 1024)
+    size = attr.ib(default=0, init=False)
+    hits = attr.ib(default=0, init=False)
+    misses = attr.ib(default=0, init=False)
+    _entries = attr.ib(default=attr.Factory(OrderedDict), init=False)
+    _current_buids = attr.ib(default=attr.Factory(dict), init=False)
+    _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')), init=False)
+
+    @staticmethod
+    def key(currency, request, req_args):
+        return currency, request, tuple(sorted(req_args.items()))
+
+    def get(self, currency, request, req_args, current_buid):
+        """
+        Get an answer from the cache
+        :param str currency: the currency requested
+        :param request: the bma request
+        :param dict req_args: the request arguments
+        :param duniterpy.documents.BlockUID current_buid: the network current block uid
+        :return: the cached data, None if it is missing
+        """
+        self.new_buid(currency, current_buid)
+        key = ResponsesCache.key(currency, request, req_args)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.data
+        self.misses += 1
+        return None
+
+    def put(self, currency, request, req_args, current_buid, data):
+        """
+        Store an answer in the cache, evicting the least recently used ones if needed
+        :param str currency: the currency requested
+        :param request: the bma request
+        :param dict req_args: the request arguments
+        :param duniterpy.documents.BlockUID current_buid: the network block uid when the request was sent
+        :param data: the answer
+        """
+        previous_buid = self._current_buids.get(currency)
+        if previous_buid is None or previous_buid != current_buid:
+            # A new block was found while requesting, the answer may already be outdated
+            return
+        try:
+            size = len(json.dumps(data))
+        except (TypeError, ValueError):
+            return
+        if size > self.max_size:
+            return
+        key = ResponsesCache.key(currency, request, req_args)
+        self.remove(key)
+        self._entries[key] = CacheEntry(data, current_buid, _immutable_block(request, req_args), size)
+        self.size += size
+        while self.size > self.max_size:
+            self.remove(next(iter(self._entries)))
+
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self.size -= entry.size
+
+    def new_buid(self, currency, current_buid):
+        """
+        Expire the answers outdated by a new network block uid
+        :param str currency: the currency
+        :param duniterpy.documents.BlockUID current_buid: the network current block uid
+        """
+        previous_buid = self._current_buids.get(currency)
+        self._current_buids[currency] = current_buid
+        if previous_buid is None or previous_buid == current_buid:
+            return
+        self._logger.debug("Cache : {0} hits, {1} misses, {2} entries, {3} bytes"
+                           .format(self.hits, self.misses, len(self._entries), self.size))
+        forked = current_buid.number <= previous_buid.number
+        for key in [k for k in self._entries if k[0] == currency]:
+            entry = self._entries[key]
+            if entry.block_number is None \
+                    or entry.block_number > current_buid.number \
+                    or (forked and entry.block_number > current_buid.number - FORK_WINDOW):
+                self.remove(key)
+
+    def expire(self, currency):
+        """
+        Expire all the answers which change with every new block.
+        Used when a document is sent to the network.
+        :param str currency: the currency
+        """
+        for key in [k for k, e in self._entries.items() if k[0] == currency and e.block_number is None]:
+            self.remove(key)
@@ -0,0 +1,97 @@
+import asyncio
+import attr
+import time
+
+# Maximum number of requests per second sent to a node
+MAX_RATE = 8
+# Minimum number of requests per second sent to a node after limitations
+MIN_RATE = 0.5
+# Number of requests which can be sent at once to a node
+BURST = 8
+# Rate recovered after each successful request
+RATE_STEP = 0.25
+
+
+@attr.s()
+class TokenBucket:
+    """
+    The budget of requests of a node
+    """
+    rate = attr.ib(default=MAX_RATE)
+    tokens = attr.ib(default=BURST)
+    updated = attr.ib(default=attr.Factory(time.monotonic))
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(BURST, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """
+        Get the time to wait before a token is available
+        :rtype: float
+        """
+        self.refill()
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+@attr.s()
+class RateLimiter:
+    """
+    Limits the rate of the requests sent to each node.
+
+    The rate of a node is halved every time it answers with HTTP_LIMITATION,
+    and slowly recovers with the successful requests.
+    """
+    _buckets = attr.ib(default=attr.Factory(dict), init=False)
+
+    def bucket(self, node):
+        """
+        :param sakia.data.entities.Node node: the node
+        :rtype: TokenBucket
+        """
+        key = (node.currency, node.pubkey)
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket()
+        return self._buckets[key]
+
+    def available(self, node):
+        """
+        Check if a request can be sent to a node right now
+        :param sakia.data.entities.Node node: the node
+        :rtype: bool
+        """
+        return self.bucket(node).delay() == 0
+
+    async def acquire(self, node):
+        """
+        Wait until a request can be sent to a node
+        :param sakia.data.entities.Node node: the node
+        """
+        bucket = self.bucket(node)
+        delay = bucket.delay()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = bucket.delay()
+        bucket.tokens -= 1
+
+    def success(self, node):
+        """
+        Record a request accepted by a node
+        :param sakia.data.entities.Node node: the node
+        """
+        bucket = self.bucket(node)
+        bucket.rate = min(MAX_RATE, bucket.rate + RATE_STEP)
+
+    def limitation(self, node):
+        """
+        Record a request refused by a node because of its rate limitation
+        :param sakia.data.entities.Node node: the node
+        """
+        bucket = self.bucket(node)
+        bucket.refill()
+        bucket.rate = max(MIN_RATE, bucket.rate / 2)
+        # The node will accept requests again once the budget of a burst is refilled
+        bucket.tokens = min(bucket.tokens, 0) - BURST
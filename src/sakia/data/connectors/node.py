@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import time
 from asyncio import TimeoutError
 from socket import gaierror
 
@@ -10,11 +11,40 @@ from aiohttp.errors import ClientError, DisconnectedError
 from aiohttp.errors import WSServerHandshakeError, ClientResponseError
 
 from duniterpy.api import bma, errors
-from duniterpy.documents import BlockUID, MalformedDocumentError, BMAEndpoint
+from duniterpy.documents import BlockUID, MalformedDocumentError, BMAEndpoint, block_uid
+from duniterpy.documents import endpoint as parse_endpoint
 from duniterpy.documents.peer import Peer, ConnectionHandler
 from sakia.decorators import asyncify
 from sakia.errors import InvalidNodeCurrency
 from ..entities.node import Node
+from ..parser import parse_peers
+
+# Maximum number of merkle leaves requested at the same time to a node
+LEAVES_CONCURRENCY = 8
+# Number of unknown leaves above which all the peers are requested at once
+BULK_LEAVES = 50
+
+ALL_PEERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "peers": {
+            "type": "array"
+        }
+    },
+    "required": ["peers"]
+}
+
+
+async def all_peers(connection):
+    """
+    GET the peering entries of every node known by a node, in a single request
+
+    :param duniterpy.api.bma.ConnectionHandler connection: Connection handler instance
+    :rtype: dict
+    """
+    client = bma.API(connection, bma.network.URL_PATH)
+    r = await client.requests_get('/peers')
+    return await bma.parse_response(r, ALL_PEERS_SCHEMA)
 
 
 class NodeConnector(QObject):
@@ -25,8 +55,9 @@ class NodeConnector(QObject):
     error = pyqtSignal()
     identity_changed = pyqtSignal()
     neighbour_found = pyqtSignal(Peer)
+    block_found = pyqtSignal(dict)
 
-    def __init__(self, node, user_parameters, session=None):
+    def __init__(self, node, user_parameters, session=None, parser=None):
         """
         Constructor
         """
@@ -37,7 +68,11 @@ class NodeConnector(QObject):
         self._connected = {'block': False,
                     'peer': False}
         self._user_parameters = user_parameters
+        self._parser = parser
         self.session = session
+        self._own_session = True
+        # When False, the node is polled by http requests instead of listened through websockets
+        self.use_websockets = True
         self._logger = logging.getLogger('sakia')
 
     def __del__(self):
@@ -46,7 +81,7 @@ class NodeConnector(QObject):
                 ws.cancel()
 
     @classmethod
-    async def from_address(cls, currency, secured, address, port, user_parameters):
+    async def from_address(cls, currency, secured, address, port, user_parameters, parser=None):
         """
         Factory method to get a node from a given address
         :param str currency: The node currency. None if we don't know\
@@ -54,6 +89,7 @@ class NodeConnector(QObject):
         :param bool secured: True if the node uses https
         :param str address: The node address
         :param int port: The node port
+        :param sakia.data.parser.DocumentsParser parser: the parser of the peer documents
         :return: A new node
         :rtype: sakia.core.net.Node
         """
@@ -63,8 +99,9 @@ class NodeConnector(QObject):
         peer_data = await bma.network.peering(ConnectionHandler(http_scheme, ws_scheme, address, port, "",
                                                                 proxy=user_parameters.proxy(), session=session))
 
-        peer = Peer.from_signed_raw("{0}{1}\n".format(peer_data['raw'],
-                                                      peer_data['signature']))
+        peer = (await cls.parse_peers(parser, ["{0}{1}\n".format(peer_data['raw'], peer_data['signature'])]))[0]
+        if not peer:
+            raise MalformedDocumentError("Peer of {0}:{1}".format(address, port))
 
         if currency and peer.currency != currency:
             raise InvalidNodeCurrency(currency, peer.currency)
@@ -72,15 +109,16 @@ class NodeConnector(QObject):
         node = Node(peer.currency, peer.pubkey, peer.endpoints, peer.blockUID)
         logging.getLogger('sakia').debug("Node from address : {:}".format(str(node)))
 
-        return cls(node, user_parameters, session=session)
+        return cls(node, user_parameters, session=session, parser=parser)
 
     @classmethod
-    def from_peer(cls, currency, peer, user_parameters):
+    def from_peer(cls, currency, peer, user_parameters, parser=None):
         """
         Factory method to get a node from a peer document.
         :param str currency: The node currency. None if we don't know\
          the currency it should have, for example if its the first one we add
         :param peer: The peer document
+        :param sakia.data.parser.DocumentsParser parser: the parser of the peer documents
         :return: A new node
         :rtype: sakia.core.net.Node
         """
@@ -90,7 +128,20 @@ class NodeConnector(QObject):
         node = Node(peer.currency, peer.pubkey, peer.endpoints, peer.blockUID)
         logging.getLogger('sakia').debug("Node from peer : {:}".format(str(node)))
 
-        return cls(node, user_parameters, session=None)
+        return cls(node, user_parameters, session=None, parser=parser)
+
+    @staticmethod
+    async def parse_peers(parser, signed_raws):
+        """
+        Parse peer documents out of the event loop, or in it if no parser is given
+        :param sakia.data.parser.DocumentsParser parser: the documents parser, or None
+        :param list[str] signed_raws: the signed raw of each peer document
+        :return: the peer documents, None for the malformed ones
+        :rtype: list[duniterpy.documents.Peer]
+        """
+        if parser:
+            return await parser.parse_peers(signed_raws)
+        return parse_peers(signed_raws)
 
     async def safe_request(self, endpoint, request, proxy, req_args={}):
         try:
@@ -105,9 +156,21 @@ class NodeConnector(QObject):
             self._logger.debug("Validation error : {0}".format(self.node.pubkey[:5]))
             self.change_state_and_emit(Node.CORRUPTED)
 
-    async def init_session(self):
-        if not self.session:
+    async def init_session(self, shared_session=None):
+        """
+        Initialize the session used by this connector
+        :param aiohttp.ClientSession shared_session: a pooled session to use instead of opening a new one.
+        It is not closed by this connector.
+        """
+        if shared_session and not shared_session.closed:
+            if self.session is not shared_session:
+                if self.session and self._own_session and not self.session.closed:
+                    await self.session.close()
+                self.session = shared_session
+                self._own_session = False
+        elif not self.session or self.session.closed:
             self.session = aiohttp.ClientSession()
+            self._own_session = True
 
     async def close_ws(self):
         for ws in self._ws_tasks.values():
@@ -117,13 +180,14 @@ class NodeConnector(QObject):
         closed = False
         while not closed:
             for ws in self._ws_tasks.values():
-                if ws:
+                if ws and not ws.done():
                     closed = False
                     break
             else:
                 closed = True
             await asyncio.sleep(0)
-        await self.session.close()
+        if self.session and self._own_session:
+            await self.session.close()
         await asyncio.sleep(0)
 
     def refresh(self, manual=False):
@@ -131,15 +195,42 @@ class NodeConnector(QObject):
         Refresh all data of this node
         :param bool manual: True if the refresh was manually initiated
         """
-        if not self._ws_tasks['block']:
-            self._ws_tasks['block'] = asyncio.ensure_future(self.connect_current_block())
+        if self.use_websockets:
+            block_task, peer_task = self.connect_current_block, self.connect_peers
+        else:
+            block_task, peer_task = self.request_current_block, self.request_peers
+
+        if not self._ws_tasks['block'] or self._ws_tasks['block'].done():
+            self._ws_tasks['block'] = asyncio.ensure_future(block_task())
 
-        if not self._ws_tasks['peer']:
-            self._ws_tasks['peer'] = asyncio.ensure_future(self.connect_peers())
+        if not self._ws_tasks['peer'] or self._ws_tasks['peer'].done():
+            self._ws_tasks['peer'] = asyncio.ensure_future(peer_task())
 
-        if manual:
+        if manual and self.use_websockets:
             asyncio.ensure_future(self.request_peers())
 
+    def stop_websockets(self):
+        """
+        Stop listening to this node, its data being polled by http requests from now on
+        """
+        self.use_websockets = False
+        # Handshakes still running are cancelled too, their node would be listened otherwise
+        for task in self._ws_tasks.values():
+            if task and not task.done():
+                task.cancel()
+
+    async def poll(self, timeout):
+        """
+        Refresh all data of this node, and wait until its websockets are connected
+        or until their HTTP fallback requests are done
+        :param float timeout: the maximum seconds to wait
+        """
+        self.refresh()
+        end = time.monotonic() + timeout
+        while time.monotonic() < end and any(task and not task.done() and not self._connected[kind]
+                                             for kind, task in self._ws_tasks.items()):
+            await asyncio.sleep(0.1)
+
     async def connect_current_block(self):
         """
         Connects to the websocket entry point of the node
@@ -151,6 +242,9 @@ class NodeConnector(QObject):
                     conn_handler = next(endpoint.conn_handler(self.session, proxy=self._user_parameters.proxy()))
                     ws_connection = bma.ws.block(conn_handler)
                     async with ws_connection as ws:
+                        if not self.use_websockets:
+                            # The node was stopped during the handshake
+                            break
                         self._connected['block'] = True
                         self._logger.debug("Connected successfully to block ws : {0}"
                                            .format(self.node.pubkey[:5]))
@@ -205,11 +299,31 @@ class NodeConnector(QObject):
 
     async def refresh_block(self, block_data):
         """
-        Refresh the blocks of this node
+        Refresh the blocks of this node.
+        When the block follows the current block of the node, the previous block is known without requesting it.
         :param dict block_data: The block data in json format
         """
         self.node.state = Node.ONLINE
-        if not self.node.current_buid or self.node.current_buid.sha_hash != block_data['hash']:
+        self.node.last_success = int(time.time())
+        current_buid = self.node.current_buid
+        if current_buid and current_buid.sha_hash == block_data['hash']:
+            self.changed.emit()
+            return
+        self.block_found.emit(block_data)
+        if not current_buid or not current_buid.sha_hash \
+                or (block_data['number'] == current_buid.number + 1
+                    and block_data.get('previousHash') == current_buid.sha_hash):
+            if current_buid and current_buid.sha_hash:
+                self.node.previous_buid = current_buid
+            elif block_data.get('previousHash'):
+                self.node.previous_buid = BlockUID(block_data['number'] - 1, block_data['previousHash'])
+            else:
+                self.node.previous_buid = BlockUID.empty()
+            self.node.current_buid = BlockUID(block_data['number'], block_data['hash'])
+            self.node.current_ts = block_data['medianTime']
+            self.changed.emit()
+        else:
+            # Blocks were missed or replaced : the block now at the number of the previous current block is requested
             for endpoint in [e for e in self.node.endpoints if isinstance(e, BMAEndpoint)]:
                 conn_handler = next(endpoint.conn_handler(self.session,
                                                      proxy=self._user_parameters.proxy()))
@@ -239,8 +353,6 @@ class NodeConnector(QObject):
             else:
                 self._logger.debug("Could not connect to any BMA endpoint : {0}".format(self.node.pubkey[:5]))
                 self.change_state_and_emit(Node.OFFLINE)
-        else:
-            self.changed.emit()
 
     @asyncify
     async def refresh_summary(self):
@@ -277,6 +389,9 @@ class NodeConnector(QObject):
                                                          proxy=self._user_parameters.proxy()))
                     ws_connection = bma.ws.peer(conn_handler)
                     async with ws_connection as ws:
+                        if not self.use_websockets:
+                            # The node was stopped during the handshake
+                            break
                         self._connected['peer'] = True
                         self._logger.debug("Connected successfully to peer ws : {0}".format(self.node.pubkey[:5]))
                         async for msg in ws:
@@ -284,7 +399,7 @@ class NodeConnector(QObject):
                                 self._logger.debug("Received a peer : {0}".format(self.node.pubkey[:5]))
                                 peer_data = bma.parse_text(msg.data, bma.ws.WS_PEER_SCHEMA)
                                 self.change_state_and_emit(Node.ONLINE)
-                                self.refresh_peer_data(peer_data)
+                                await self.refresh_peer_data(peer_data)
                             elif msg.tp == aiohttp.MsgType.closed:
                                 break
                             elif msg.tp == aiohttp.MsgType.error:
@@ -317,28 +432,22 @@ class NodeConnector(QObject):
                 if not peers_data:
                     continue
                 self.node.state = Node.ONLINE
+                self.node.last_success = int(time.time())
                 if peers_data['root'] != self.node.merkle_peers_root:
-                    leaves = [leaf for leaf in peers_data['leaves']
-                              if leaf not in self.node.merkle_peers_leaves]
-                    for leaf_hash in leaves:
-                        try:
-                            leaf_data = await self.safe_request(endpoint,
-                                                                bma.network.peers,
-                                                                proxy=self._user_parameters.proxy(),
-                                                                req_args={'leaf': leaf_hash})
-                            if not leaf_data:
-                                break
-                            self.refresh_peer_data(leaf_data['leaf']['value'])
-                        except (AttributeError, ValueError, errors.DuniterError) as e:
-                            self._logger.debug("{pubkey} : Incorrect peer data in {leaf}"
-                                          .format(pubkey=self.node.pubkey[:5],
-                                                  leaf=leaf_hash))
-                            self.node.state = Node.OFFLINE
-                        finally:
-                            self.changed.emit()
-                    else:
+                    known_leaves = set(self.node.merkle_peers_leaves)
+                    leaves = [leaf for leaf in peers_data['leaves'] if leaf not in known_leaves]
+                    received = set()
+                    if len(leaves) > BULK_LEAVES:
+                        received = await self.request_all_peers(endpoint) & set(leaves)
+                    missing = [leaf for leaf in leaves if leaf not in received]
+                    if missing:
+                        received |= await self.request_leaves(endpoint, missing)
+                    # The leaves obtained are not requested again, the root is known once every leaf is obtained
+                    obtained = tuple(leaf for leaf in peers_data['leaves'] if leaf in known_leaves or leaf in received)
+                    self.node.merkle_peers_leaves = obtained
+                    if len(obtained) == len(peers_data['leaves']):
                         self.node.merkle_peers_root = peers_data['root']
-                        self.node.merkle_peers_leaves = tuple(peers_data['leaves'])
+                    self.changed.emit()
                 return  # Break endpoints loop
             except errors.DuniterError as e:
                 self._logger.debug("Error in peers reply : {0}".format(str(e)))
@@ -347,15 +456,83 @@ class NodeConnector(QObject):
             self._logger.debug("Could not connect to any BMA endpoint : {0}".format(self.node.pubkey[:5]))
             self.change_state_and_emit(Node.OFFLINE)
 
-    def refresh_peer_data(self, peer_data):
-        if "raw" in peer_data:
+    async def request_leaves(self, endpoint, leaves):
+        """
+        Request the peers of the given merkle leaves, a bounded number at the same time.
+        The peer documents received are parsed together.
+        :param duniterpy.documents.BMAEndpoint endpoint: the endpoint of the node
+        :param list[str] leaves: the hashes of the leaves
+        :return: the hashes of the leaves received with a valid peer document
+        :rtype: set[str]
+        """
+        semaphore = asyncio.Semaphore(LEAVES_CONCURRENCY)
+        values = {}
+
+        async def request_leaf(leaf_hash):
+            async with semaphore:
+                try:
+                    leaf_data = await self.safe_request(endpoint,
+                                                        bma.network.peers,
+                                                        proxy=self._user_parameters.proxy(),
+                                                        req_args={'leaf': leaf_hash})
+                    if leaf_data:
+                        value = leaf_data['leaf']['value']
+                        values[leaf_hash] = "{0}{1}\n".format(value['raw'], value['signature'])
+                except (AttributeError, KeyError, TypeError, ValueError, errors.DuniterError) as e:
+                    self._logger.debug("{pubkey} : Incorrect peer data in {leaf}"
+                                       .format(pubkey=self.node.pubkey[:5],
+                                               leaf=leaf_hash))
+
+        await asyncio.gather(*[request_leaf(leaf_hash) for leaf_hash in leaves])
+        received = set()
+        leaf_hashes = list(values.keys())
+        peers = await self.parse_peers(self._parser, [values[leaf_hash] for leaf_hash in leaf_hashes])
+        for leaf_hash, peer in zip(leaf_hashes, peers):
+            if peer:
+                received.add(leaf_hash)
+                self.neighbour_found.emit(peer)
+            else:
+                self._logger.debug("{pubkey} : Malformed peer in {leaf}".format(pubkey=self.node.pubkey[:5],
+                                                                                 leaf=leaf_hash))
+        return received
+
+    async def request_all_peers(self, endpoint):
+        """
+        Request every peer known by the node at once.
+        The leaves of the peers missing from the answer are left to the merkle leaves requests.
+        :param duniterpy.documents.BMAEndpoint endpoint: the endpoint of the node
+        :return: the hashes of the leaves of the peers received
+        :rtype: set[str]
+        """
+        received = set()
+        try:
+            conn_handler = next(endpoint.conn_handler(self.session, proxy=self._user_parameters.proxy()))
+            peers_data = await all_peers(conn_handler)
+        except (ClientError, gaierror, TimeoutError, DisconnectedError, ValueError,
+                jsonschema.ValidationError, errors.DuniterError) as e:
+            self._logger.debug("Peers list unavailable {0} : {1}".format(str(e), self.node.pubkey[:5]))
+            return received
+        for entry in peers_data['peers']:
             try:
-                str_doc = "{0}{1}\n".format(peer_data['raw'],
-                                            peer_data['signature'])
-                peer_doc = Peer.from_signed_raw(str_doc)
+                peer_doc = Peer(entry['version'], entry['currency'], entry['pubkey'],
+                                block_uid(entry['block']), [parse_endpoint(e) for e in entry['endpoints']],
+                                entry['signature'])
+                # The merkle leaf of a peer is the hash of its signed document
+                received.add(peer_doc.sha_hash)
                 self.neighbour_found.emit(peer_doc)
-            except MalformedDocumentError as e:
-                self._logger.debug(str(e))
+            except (KeyError, TypeError, ValueError, MalformedDocumentError) as e:
+                self._logger.debug("Incorrect peer in list : {0}".format(str(e)))
+        return received
+
+    async def refresh_peer_data(self, peer_data):
+        if "raw" in peer_data:
+            str_doc = "{0}{1}\n".format(peer_data['raw'],
+                                        peer_data['signature'])
+            peer_doc = (await self.parse_peers(self._parser, [str_doc]))[0]
+            if peer_doc:
+                self.neighbour_found.emit(peer_doc)
+            else:
+                self._logger.debug("Malformed peer document : {0}".format(self.node.pubkey[:5]))
         else:
             self._logger.debug("Incorrect leaf reply")
 
@@ -0,0 +1,116 @@
+import attr
+import random
+import time
+
+# Smoothing factor of the moving averages
+ALPHA = 0.3
+# Latency in milliseconds assumed for nodes never requested, optimistic so that they get explored
+UNKNOWN_LATENCY = 300
+# Seconds during which a node which limited our requests is avoided
+LIMITATION_DELAY = 30
+# Ratio of selections made at random, to keep measuring the nodes which have bad scores
+EXPLORATION = 0.1
+
+
+@attr.s()
+class Score:
+    """
+    The health of a node, measured from the requests sent to it
+    """
+    # Moving average of the latency in milliseconds, 0 if unknown
+    latency = attr.ib(default=0)
+    # Moving average of the ratio of failed requests
+    error_rate = attr.ib(default=0.)
+    # The last time the node limited our requests
+    last_limitation = attr.ib(default=0)
+
+    def cost(self, now):
+        """
+        Get the expected cost of a request sent to the node. The lower, the better.
+        :param float now: the current timestamp
+        :rtype: float
+        """
+        cost = (self.latency or UNKNOWN_LATENCY) * (1 + 4 * self.error_rate)
+        if now - self.last_limitation < LIMITATION_DELAY:
+            cost *= 10
+        return cost
+
+
+@attr.s()
+class Scoreboard:
+    """
+    The scores of the nodes, used to send requests to healthy and fast nodes first.
+    Scores are initialized from the nodes entities, and updated with every request.
+    """
+    _scores = attr.ib(default=attr.Factory(dict), init=False)
+    _changed = attr.ib(default=attr.Factory(set), init=False)
+
+    def score(self, node):
+        """
+        Get the score of a node
+        :param sakia.data.entities.Node node: the node
+        :rtype: Score
+        """
+        key = (node.currency, node.pubkey)
+        if key not in self._scores:
+            self._scores[key] = Score(node.latency, node.error_rate, node.last_limitation)
+        return self._scores[key]
+
+    def order(self, nodes):
+        """
+        Order nodes randomly, with the best scores having more chances to come first
+        :param list[sakia.data.entities.Node] nodes: the nodes
+        :return: the ordered nodes
+        :rtype: list[sakia.data.entities.Node]
+        """
+        nodes = list(nodes)
+        if not nodes or random.random() < EXPLORATION:
+            random.shuffle(nodes)
+            return nodes
+        now = time.time()
+        costs = [self.score(n).cost(now) for n in nodes]
+        min_cost = min(costs)
+        # Weighted random sampling : the key of a node of weight w is u^(1/w)
+        keys = [random.random() ** (c / min_cost) for c in costs]
+        return [n for k, n in sorted(zip(keys, nodes), key=lambda kn: kn[0], reverse=True)]
+
+    def success(self, node, latency):
+        """
+        Record an answer of a node
+        :param sakia.data.entities.Node node: the node
+        :param float latency: the time to get the answer, in milliseconds
+        """
+        score = self.score(node)
+        if score.latency:
+            score.latency = int(ALPHA * latency + (1 - ALPHA) * score.latency)
+        else:
+            score.latency = int(latency)
+        score.error_rate *= (1 - ALPHA)
+        self._changed.add((node.currency, node.pubkey))
+
+    def failure(self, node):
+        """
+        Record a failed request to a node
+        :param sakia.data.entities.Node node: the node
+        """
+        score = self.score(node)
+        score.error_rate = ALPHA + (1 - ALPHA) * score.error_rate
+        self._changed.add((node.currency, node.pubkey))
+
+    def limitation(self, node):
+        """
+        Record a request refused by a node because of its rate limitation
+        :param sakia.data.entities.Node node: the node
+        """
+        self.score(node).last_limitation = int(time.time())
+        self._changed.add((node.currency, node.pubkey))
+
+    def pop_changed(self):
+        """
+        Get the scores changed since the last call
+        :return: the currency, pubkey and score of every changed node
+        :rtype: list[tuple]
+        """
+        changed = [(currency, pubkey, self._scores[(currency, pubkey)]) for currency, pubkey in self._changed]
+        self._changed.clear()
+        return changed
@@ -0,0 +1,48 @@
+import attr
+from aiohttp.client_reqrep import ClientRequest, ClientResponse
+from aiohttp.client_ws import ClientWebSocketResponse
+
+
+@attr.s()
+class TrafficStats:
+    """
+    Counts the requests sent and the bytes received through a session
+    """
+    requests = attr.ib(default=0)
+    bytes_received = attr.ib(default=0)
+    ws_messages = attr.ib(default=0)
+
+    def session_classes(self):
+        """
+        Get the request and response classes counting the traffic, to give to an aiohttp session
+        :rtype: dict
+        """
+        stats = self
+
+        class CountedRequest(ClientRequest):
+            def send(self, *args, **kwargs):
+                stats.requests += 1
+                return super().send(*args, **kwargs)
+
+        class CountedResponse(ClientResponse):
+            async def read(self):
+                counted = self._content is not None
+                content = await super().read()
+                if not counted and content:
+                    stats.bytes_received += len(content)
+                return content
+
+        class CountedWebSocketResponse(ClientWebSocketResponse):
+            async def receive(self, timeout=None):
+                msg = await super().receive(timeout)
+                if isinstance(msg.data, str):
+                    stats.ws_messages += 1
+                    stats.bytes_received += len(msg.data.encode('utf-8'))
+                elif isinstance(msg.data, bytes):
+                    stats.ws_messages += 1
+                    stats.bytes_received += len(msg.data)
+                return msg
+
+        return {'request_class': CountedRequest,
+                'response_class': CountedResponse,
+                'ws_response_class': CountedWebSocketResponse}
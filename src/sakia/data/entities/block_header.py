@@ -0,0 +1,15 @@
+import attr
+
+
+@attr.s()
+class BlockHeader:
+    currency = attr.ib(convert=str)
+    number = attr.ib(convert=int)
+    hash = attr.ib(convert=str, cmp=False, hash=False)
+    previous_hash = attr.ib(convert=str, cmp=False, hash=False)
+    median_time = attr.ib(convert=int, cmp=False, hash=False)
+    # The dividend created in the block, 0 if none
+    dividend = attr.ib(convert=int, cmp=False, hash=False)
+    unit_base = attr.ib(convert=int, cmp=False, hash=False)
+    members_count = attr.ib(convert=int, cmp=False, hash=False)
+    monetary_mass = attr.ib(convert=int, cmp=False, hash=False)
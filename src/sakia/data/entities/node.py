@@ -78,4 +78,12 @@ class Node:
     root = attr.ib(convert=bool, cmp=False, default=False)
     # If this node is a member or not
     member = attr.ib(convert=bool, cmp=False, default=False)
+    # The average latency of the node answers, in milliseconds. 0 if unknown
+    latency = attr.ib(convert=int, cmp=False, default=0)
+    # The average ratio of failed requests sent to the node
+    error_rate = attr.ib(convert=float, cmp=False, default=0)
+    # The last time the node refused a request because of its rate limitation
+    last_limitation = attr.ib(convert=int, cmp=False, default=0)
+    # The last time the node answered with its current block
+    last_success = attr.ib(convert=int, cmp=False, default=0)
 
@@ -17,6 +17,8 @@ class UserParameters:
     proxy_type = attr.ib(convert=int, default=0)
     proxy_address = attr.ib(convert=str, default="")
     proxy_port = attr.ib(convert=int, default=8080)
+    # Number of nodes listened through websockets, the others being polled
+    max_websockets = attr.ib(convert=int, default=10)
 
     def proxy(self):
         if self.enable_proxy is True:
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import os
+import pickle
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import attr
+from duniterpy.documents import Block, Peer, MalformedDocumentError
+from duniterpy.documents import Transaction as TransactionDoc
+from duniterpy.key import VerifyingKey
+
+# Number of processes parsing documents
+WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# Seconds the peer documents are gathered before being verified together
+VERIFY_WINDOW = 0.2
+# Number of verified peer documents remembered
+VERIFIED_PEERS = 4096
+
+
+def parse_blocks(blocks_data):
+    """
+    Parse blocks, checking their hashes
+    :param list[(str, str, str)] blocks_data: the signed raw, the announced hash and previous hash of each block
+    :return: the blocks documents, or None if a block does not match its hashes
+    :rtype: list[duniterpy.documents.Block]
+    """
+    blocks = []
+    for signed_raw, sha_hash, previous_hash in blocks_data:
+        block = Block.from_signed_raw(signed_raw)
+        if block.blockUID.sha_hash != sha_hash or (block.prev_hash or "") != (previous_hash or ""):
+            return None
+        blocks.append(block)
+    return blocks
+
+
+def parse_transactions(signed_raws):
+    """
+    Parse transactions
+    :param list[str] signed_raws: the signed raw of each transaction
+    :rtype: list[duniterpy.documents.Transaction]
+    """
+    return [TransactionDoc.from_signed_raw(raw) for raw in signed_raws]
+
+
+def parse_peers(signed_raws):
+    """
+    Parse peer documents
+    :param list[str] signed_raws: the signed raw of each peer document
+    :return: the peer documents, None for the malformed ones
+    :rtype: list[duniterpy.documents.Peer]
+    """
+    peers = []
+    for raw in signed_raws:
+        try:
+            peers.append(Peer.from_signed_raw(raw))
+        except (MalformedDocumentError, IndexError):
+            # Truncated documents raise an IndexError
+            peers.append(None)
+    return peers
+
+
+def verify_peers(peers):
+    """
+    Verify the signatures of peer documents
+    :param list[duniterpy.documents.Peer] peers: the peer documents
+    :return: True for each document signed by its pubkey
+    :rtype: list[bool]
+    """
+    return [VerifyingKey(peer.pubkey).verify_document(peer) for peer in peers]
+
+
+def _call(function, *args):
+    """
+    Call a parsing function in a worker process.
+    The errors raised by the function are returned, so that they are told apart from the pickling errors
+    :param function: a module level function
+    :param args: the function arguments
+    :return: the function result, and the error it raised
+    :rtype: tuple
+    """
+    try:
+        return function(*args), None
+    except Exception as e:
+        return None, e
+
+
+@attr.s()
+class DocumentsParser:
+    """
+    Parses and verifies batches of documents out of the event loop.
+    Batches are sent to a pool of processes, or to a pool of threads if processes cannot be used.
+    """
+    _executor = attr.ib(default=None)
+    _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
+
+    def executor(self):
+        """
+        Get the executor, the process pool being created at first use
+        :rtype: concurrent.futures.Executor
+        """
+        if not self._executor:
+            try:
+                self._executor = ProcessPoolExecutor(max_workers=WORKERS)
+            except (OSError, NotImplementedError, ImportError) as e:
+                self._logger.debug("Could not start parsing processes : {0}".format(str(e)))
+                self._executor = ThreadPoolExecutor(max_workers=WORKERS)
+        return self._executor
+
+    async def run(self, function, *args):
+        """
+        Run a parsing function in the executor
+        :param function: a module level function
+        :param args: the function arguments
+        :return: the function result
+        """
+        loop = asyncio.get_event_loop()
+        executor = self.executor()
+        if not isinstance(executor, ProcessPoolExecutor):
+            return await loop.run_in_executor(executor, function, *args)
+        try:
+            result, error = await loop.run_in_executor(executor, _call, function, *args)
+        except (BrokenProcessPool, OSError) as e:
+            self._logger.debug("Parsing processes failed, using threads : {0}".format(str(e)))
+            self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(max_workers=WORKERS)
+            return await loop.run_in_executor(self._executor, function, *args)
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            # The errors of the function are returned by _call : these ones come from the pickling.
+            # Arguments which cannot be pickled raise one of them, depending on their type.
+            self._logger.debug("Could not send {0} to the parsing processes : {1}".format(function.__name__, str(e)))
+            return await loop.run_in_executor(None, function, *args)
+        if error:
+            raise error
+        return result
+
+    async def parse_blocks(self, blocks_data):
+        """
+        Parse blocks data received from bma, checking their hashes.
+        The hashes chaining the blocks data must be the ones of the signed documents.
+        :param list[dict] blocks_data: the blocks data
+        :return: the blocks documents, or None if a block does not match its hashes
+        :rtype: list[duniterpy.documents.Block]
+        """
+        return await self.run(parse_blocks, [(data["raw"] + data["signature"] + "\n", data["hash"],
+                                              data["previousHash"]) for data in blocks_data])
+
+    async def parse_transactions(self, signed_raws):
+        """
+        Parse transactions documents
+        :param list[str] signed_raws: the signed raw of each transaction
+        :rtype: list[duniterpy.documents.Transaction]
+        """
+        return await self.run(parse_transactions, signed_raws)
+
+    async def parse_peers(self, signed_raws):
+        """
+        Parse peer documents
+        :param list[str] signed_raws: the signed raw of each peer document
+        :return: the peer documents, None for the malformed ones
+        :rtype: list[duniterpy.documents.Peer]
+        """
+        return await self.run(parse_peers, signed_raws)
+
+    async def verify_peers(self, peers):
+        """
+        Verify the signatures of peer documents
+        :param list[duniterpy.documents.Peer] peers: the peer documents
+        :return: True for each document signed by its pubkey
+        :rtype: list[bool]
+        """
+        return await self.run(verify_peers, peers)
+
+    def shutdown(self):
+        """
+        Stop the workers
+        """
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+@attr.s()
+class PeersVerifier:
+    """
+    Verifies the peer documents by batches : the documents received during a short window
+    are verified together by the documents parser.
+    The results are remembered by document, so that a peer announced by several nodes is verified once.
+    """
+    _parser = attr.ib()  # :type DocumentsParser
+    window = attr.ib(default=VERIFY_WINDOW)
+    _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
+    _verified = attr.ib(default=attr.Factory(OrderedDict), init=False)
+    _pending = attr.ib(default=attr.Factory(dict), init=False)
+    _handle = attr.ib(default=None, init=False)
+
+    async def verify(self, peer):
+        """
+        Verify the signature of a peer document
+        :param duniterpy.documents.Peer peer: the peer document
+        :return: True if the document is signed by its pubkey
+        :rtype: bool
+        """
+        # The signature alone is not enough : a valid signature could be sent with another document
+        key = peer.signed_raw()
+        if key in self._verified:
+            self._verified.move_to_end(key)
+            return self._verified[key]
+        if key not in self._pending:
+            loop = asyncio.get_event_loop()
+            self._pending[key] = (peer, loop.create_future())
+            if not self._handle:
+                self._handle = loop.call_later(self.window, self._verify_pending)
+        return await asyncio.shield(self._pending[key][1])
+
+    def _verify_pending(self):
+        self._handle = None
+        pending, self._pending = self._pending, {}
+        asyncio.ensure_future(self._verify(pending))
+
+    async def _verify(self, pending):
+        keys = list(pending.keys())
+        try:
+            results = await self._parser.verify_peers([pending[k][0] for k in keys])
+        except Exception as e:
+            self._logger.debug("Could not verify {0} peers : {1}".format(len(keys), str(e)))
+            results = [False] * len(keys)
+        else:
+            for key, valid in zip(keys, results):
+                self._verified[key] = valid
+            while len(self._verified) > VERIFIED_PEERS:
+                self._verified.popitem(last=False)
+        for key, valid in zip(keys, results):
+            future = pending[key][1]
+            if not future.done():
+                future.set_result(valid)
@@ -1,20 +1,88 @@
 import attr
 import sqlite3
 import logging
+from collections import OrderedDict
 from sakia.errors import NoPeerAvailable
-from ..entities import Blockchain, BlockchainParameters
+from ..entities import Blockchain, BlockchainParameters, BlockHeader
 from .nodes import NodesProcessor
 from ..connectors import BmaConnector
+from ..parser import DocumentsParser
 from duniterpy.api import bma, errors
 from duniterpy.documents import Block, BMAEndpoint
-import asyncio
+
+# Number of blocks requested at once
+BLOCKS_CHUNK = 100
+# Maximum number of chunks downloaded at the same time
+SYNC_WINDOW = 4
+# Number of blocks pushed by the nodes kept to spare their download
+PUSHED_BLOCKS = 16
+# Number of timestamps of blocks out of the headers table remembered
+TIMESTAMPS = 1024
+# Fields of the blocks data listing the identities and money changes
+CHANGES_FIELDS = ('joiners', 'leavers', 'actives', 'excluded', 'identities', 'transactions', 'dividend')
+
+
+def _chained(blocks_data, start, previous):
+    """
+    Check that the blocks of a chunk follow each other
+    :param list[dict] blocks_data: the blocks of the chunk
+    :param int start: the number of the first block of the chunk
+    :param dict previous: the last block known before the chunk, or None
+    :rtype: bool
+    """
+    if not blocks_data or blocks_data[0]['number'] != start:
+        return False
+    if previous and start == previous['number']:
+        # The chunk starts with the previous block itself
+        if blocks_data[0]['hash'] != previous['hash']:
+            return False
+        blocks_data = blocks_data[1:]
+    for data in blocks_data:
+        if previous and (data['number'] != previous['number'] + 1 or data['previousHash'] != previous['hash']):
+            return False
+        previous = data
+    return True
+
+
+def _with_changes(data):
+    """
+    Check if a block changes the identities or the money, so that it must be applied.
+    A block missing one of the fields is considered as changing them.
+    :param dict data: the block data
+    :rtype: bool
+    """
+    return any(data.get(field, True) for field in CHANGES_FIELDS)
+
+
+def _block_header(currency, data):
+    """
+    Get the header of a block
+    :param str currency: the currency of the block
+    :param dict data: the block data
+    :rtype: sakia.data.entities.BlockHeader
+    """
+    return BlockHeader(currency=currency,
+                       number=data['number'],
+                       hash=data['hash'],
+                       previous_hash=data['previousHash'] or "",
+                       median_time=data['medianTime'],
+                       dividend=data['dividend'] or 0,
+                       unit_base=data['unitbase'],
+                       members_count=data['membersCount'],
+                       monetary_mass=data['monetaryMass'])
 
 
 @attr.s
 class BlockchainProcessor:
     _repo = attr.ib()  # :type sakia.data.repositories.CertificationsRepo
+    _headers_repo = attr.ib()  # :type sakia.data.repositories.BlockHeadersRepo
     _bma_connector = attr.ib()  # :type sakia.data.connectors.bma.BmaConnector
+    _parser = attr.ib(default=attr.Factory(DocumentsParser))  # :type sakia.data.parser.DocumentsParser
     _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
+    # Timestamps of the blocks out of the headers table, the least recently used being forgotten
+    _timestamps = attr.ib(default=attr.Factory(OrderedDict), init=False)
+    # Last blocks pushed by the nodes, by currency and number
+    _pushed = attr.ib(default=attr.Factory(dict), init=False)
 
     @classmethod
     def instanciate(cls, app):
@@ -24,12 +92,26 @@ class BlockchainProcessor:
         :rtype: sakia.data.processors.BlockchainProcessor
         """
         return cls(app.db.blockchains_repo,
-                   BmaConnector(NodesProcessor(app.db.nodes_repo), app.parameters))
+                   app.db.block_headers_repo,
+                   app.bma_connector,
+                   app.documents_parser)
 
     def initialized(self, currency):
-        return self._repo.get_one(currency=currency) is not None
+        return self._repo.snapshot(currency) is not None
 
     async def ud_before(self, currency, block_number):
+        """
+        Get the last dividend created before a block.
+        The headers table knows every dividend from the oldest it contains to the local current block.
+        :param str currency: the currency
+        :param int block_number: the block number
+        :return: the dividend amount and base
+        :rtype: tuple
+        """
+        if block_number <= self.current_buid(currency).number:
+            header = self._headers_repo.last_dividend(currency, block_number)
+            if header:
+                return header.dividend, header.unit_base
         try:
             udblocks = await self._bma_connector.get(currency, bma.blockchain.ud)
             blocks = udblocks['result']['blocks']
@@ -48,9 +130,25 @@ class BlockchainProcessor:
         return 0, 0
 
     async def timestamp(self, currency, block_number):
+        """
+        Get the median time of a block, requesting the network only if the block header is not known
+        :param str currency: the currency
+        :param int block_number: the block number
+        :rtype: int
+        """
+        header = self._headers_repo.get_one(currency, block_number)
+        if header:
+            return header.median_time
+        if (currency, block_number) in self._timestamps:
+            self._timestamps.move_to_end((currency, block_number))
+            return self._timestamps[(currency, block_number)]
         try:
             block = await self._bma_connector.get(currency, bma.blockchain.block, {'number': block_number})
             if block:
+                # Not stored in the headers table, which must not miss dividends between its blocks
+                self._timestamps[(currency, block_number)] = block['medianTime']
+                while len(self._timestamps) > TIMESTAMPS:
+                    self._timestamps.popitem(last=False)
                 return block['medianTime']
         except NoPeerAvailable as e:
             self._logger.debug(str(e))
@@ -66,7 +164,7 @@ class BlockchainProcessor:
         Get the local current blockuid
         :rtype: duniterpy.documents.BlockUID
         """
-        blockchain = self._repo.get_one(currency=currency)
+        blockchain = self._repo.snapshot(currency)
         return blockchain.current_buid
 
     def time(self, currency):
@@ -74,42 +172,42 @@ class BlockchainProcessor:
         Get the local current median time
         :rtype: int
         """
-        return self._repo.get_one(currency=currency).median_time
+        return self._repo.snapshot(currency).median_time
 
     def parameters(self, currency):
         """
         Get the parameters of the blockchain
         :rtype: sakia.data.entities.BlockchainParameters
         """
-        return self._repo.get_one(currency=currency).parameters
+        return self._repo.snapshot(currency).parameters
 
     def current_mass(self, currency):
         """
         Get the local current monetary mass
         :rtype: int
         """
-        return self._repo.get_one(currency=currency).current_mass
+        return self._repo.snapshot(currency).current_mass
 
     def current_members_count(self, currency):
         """
         Get the number of members in the blockchain
         :rtype: int
         """
-        return self._repo.get_one(currency=currency).current_members_count
+        return self._repo.snapshot(currency).current_members_count
 
     def last_members_count(self, currency):
         """
         Get the last ud value and base
         :rtype: int, int
         """
-        return self._repo.get_one(currency=currency).last_members_count
+        return self._repo.snapshot(currency).last_members_count
 
     def last_ud(self, currency):
         """
         Get the last ud value and base
         :rtype: int, int
         """
-        blockchain = self._repo.get_one(currency=currency)
+        blockchain = self._repo.snapshot(currency)
         try:
             return blockchain.last_ud, blockchain.last_ud_base
         except AttributeError:
@@ -120,7 +218,7 @@ class BlockchainProcessor:
         Get the last ud time
         :rtype: int
         """
-        blockchain = self._repo.get_one(currency=currency)
+        blockchain = self._repo.snapshot(currency)
         return blockchain.last_ud_time
 
     def previous_monetary_mass(self, currency):
@@ -128,21 +226,21 @@ class BlockchainProcessor:
         Get the local current monetary mass
         :rtype: int
         """
-        return self._repo.get_one(currency=currency).previous_mass
+        return self._repo.snapshot(currency).previous_mass
 
     def previous_members_count(self, currency):
         """
         Get the local current monetary mass
         :rtype: int
         """
-        return self._repo.get_one(currency=currency).previous_members_count
+        return self._repo.snapshot(currency).previous_members_count
 
     def previous_ud(self, currency):
         """
         Get the previous ud value and base
         :rtype: int, int
         """
-        blockchain = self._repo.get_one(currency=currency)
+        blockchain = self._repo.snapshot(currency)
         return blockchain.previous_ud, blockchain.previous_ud_base
 
     def previous_ud_time(self, currency):
@@ -150,7 +248,7 @@ class BlockchainProcessor:
         Get the previous ud time
         :rtype: int
         """
-        blockchain = self._repo.get_one(currency=currency)
+        blockchain = self._repo.snapshot(currency)
         return blockchain.previous_ud_time
 
     async def get_block(self, currency, number):
@@ -165,58 +263,159 @@ class BlockchainProcessor:
             block_doc = Block.from_signed_raw("{0}{1}\n".format(block['raw'], block['signature']))
             return block_doc
 
-    async def new_blocks_with_identities(self, currency):
-        """
-        Get blocks more recent than local blockuid
-        with identities
-        """
-        with_identities = []
-        future_requests = []
-        for req in (bma.blockchain.joiners,
-                    bma.blockchain.leavers,
-                    bma.blockchain.actives,
-                    bma.blockchain.excluded,
-                    bma.blockchain.newcomers):
-            future_requests.append(self._bma_connector.get(currency, req))
-        results = await asyncio.gather(*future_requests)
-
-        for res in results:
-            with_identities += res["result"]["blocks"]
-
-        local_current_buid = self.current_buid(currency)
-        return sorted([b for b in with_identities if b > local_current_buid.number])
-
-    async def new_blocks_with_money(self, currency):
+    async def _anchored(self, currency, data, network_buid):
         """
-        Get blocks more recent than local block uid
-        with money data (tx and uds)
+        Check that a block belongs to the blockchain of the network, either because it is
+        the current block of the network or because a quorum of nodes agrees on it
+        :param str currency: the currency of the block
+        :param dict data: the block data
+        :param duniterpy.documents.BlockUID network_buid: the current block of the network, or None
+        :rtype: bool
         """
-        with_money = []
-        future_requests = []
-        for req in (bma.blockchain.ud, bma.blockchain.tx):
-            future_requests.append(self._bma_connector.get(currency, req))
-        results = await asyncio.gather(*future_requests)
-
-        for res in results:
-            with_money += res["result"]["blocks"]
-
-        local_current_buid = self.current_buid(currency)
-        return sorted([b for b in with_money if b > local_current_buid.number])
-
-    async def next_blocks(self, start, filter, currency):
-        """
-        Get blocks from the network
-        :param List[int] numbers: list of blocks numbers to get
-        :return: the list of block documents
+        if network_buid and data['number'] == network_buid.number:
+            return data['hash'] == network_buid.sha_hash
+        try:
+            verified = await self._bma_connector.get(currency, bma.blockchain.block, req_args={'number': data['number']})
+        except (NoPeerAvailable, errors.DuniterError) as e:
+            self._logger.debug(str(e))
+            return False
+        return bool(verified) and verified['hash'] == data['hash']
+
+    async def next_blocks_data(self, start, filter, currency, previous=None, network_buid=None):
+        """
+        Get blocks data from the network.
+        The missing range is split in chunks downloaded from different nodes at the same time.
+        Chunks are verified by the continuity of their hash chain from the previous block,
+        a chunk breaking it is requested again to a quorum of nodes.
+        The last block downloaded must be agreed by the network, else every chunk is requested to a quorum of nodes.
+        Every block of the range is downloaded, so the blocks changing the identities or the money
+        are selected from their data instead of requesting the lists of these blocks to the network.
+
+        :param int start: the number of the last block handled, from which the range is downloaded
+        :param List[int] filter: list of blocks numbers to get besides the blocks with changes
+        :param str currency: the currency of the blockchain
+        :param dict previous: the data of the block preceding the range, by default the local current block
+        :param duniterpy.documents.BlockUID network_buid: the current block of the network
+        :return: the filtered blocks data and the last block downloaded, in order
+        :rtype: List[dict]
+        """
+        end = max(filter + [start])
+        if not previous:
+            local_buid = self.current_buid(currency)
+            if local_buid.sha_hash and start in (local_buid.number, local_buid.number + 1):
+                previous = {'number': local_buid.number, 'hash': local_buid.sha_hash}
+
+        pushed = self._pushed_blocks_data(currency, start, end, previous)
+        # The blocks pushed by a single node are only used if they lead to a block agreed by the network
+        if pushed and not await self._anchored(currency, pushed[-1], network_buid):
+            self._logger.debug("Pushed blocks up to {0} are not agreed, downloading them".format(end))
+            pushed = None
+        if pushed:
+            self._headers_repo.insert_all([_block_header(currency, data) for data in pushed])
+            selected = [data for data in pushed if data['number'] in filter or _with_changes(data)]
+            if not selected or selected[-1]['number'] != pushed[-1]['number']:
+                selected.append(pushed[-1])
+            return selected
+
+        starts = [start + i * BLOCKS_CHUNK for i in range(min(SYNC_WINDOW, (end - start) // BLOCKS_CHUNK + 1))]
+        chunks = await self._bma_connector.sharded_get(currency, bma.blockchain.blocks,
+                                                       [{'count': BLOCKS_CHUNK, 'start': s} for s in starts])
+
+        window_previous = previous
+        window = []
+        for chunk_start, blocks_data in zip(starts, chunks):
+            if isinstance(blocks_data, BaseException) or not _chained(blocks_data, chunk_start, previous):
+                self._logger.debug("Chunk from {0} is not chained, verifying it".format(chunk_start))
+                try:
+                    blocks_data = await self._bma_connector.get(currency, bma.blockchain.blocks,
+                                                                req_args={'count': BLOCKS_CHUNK, 'start': chunk_start})
+                except (NoPeerAvailable, errors.DuniterError):
+                    if not window:
+                        raise
+                    break
+                if not _chained(blocks_data, chunk_start, previous):
+                    break
+            window.append(blocks_data)
+            previous = blocks_data[-1]
+            if len(blocks_data) < BLOCKS_CHUNK:
+                # The chunk reached the end of the blockchain
+                break
+
+        # A node could serve a forged chain chaining from the previous block,
+        # so the window is accepted only if its last block is agreed by the network
+        if window and not await self._anchored(currency, window[-1][-1], network_buid):
+            self._logger.debug("Blocks from {0} are not agreed by the network, verifying them".format(start))
+            window = await self._verified_chunks(currency, [blocks_data[0]['number'] for blocks_data in window],
+                                                 window_previous)
+
+        selected = []
+        last_data = None
+        for blocks_data in window:
+            self._headers_repo.insert_all([_block_header(currency, data) for data in blocks_data])
+            selected += [data for data in blocks_data
+                         if data['number'] > start and (data['number'] in filter or _with_changes(data))]
+            last_data = blocks_data[-1]
+
+        if last_data and (not selected or selected[-1]['number'] != last_data['number']):
+            selected.append(last_data)
+        return selected
+
+    async def _verified_chunks(self, currency, starts, previous):
+        """
+        Get chunks of blocks agreed by a quorum of nodes
+        :param str currency: the currency of the blockchain
+        :param List[int] starts: the number of the first block of each chunk
+        :param dict previous: the data of the block preceding the chunks
+        :return: the chunks following each other from the previous block
+        :rtype: List[List[dict]]
+        """
+        chunks = []
+        for chunk_start in starts:
+            blocks_data = await self._bma_connector.get(currency, bma.blockchain.blocks,
+                                                        req_args={'count': BLOCKS_CHUNK, 'start': chunk_start})
+            if not _chained(blocks_data, chunk_start, previous):
+                break
+            chunks.append(blocks_data)
+            previous = blocks_data[-1]
+        return chunks
+
+    def receive_block(self, currency, block_data):
+        """
+        Keep a block pushed by a node, so that it is not downloaded again
+        :param str currency: the currency of the block
+        :param dict block_data: the block data
+        """
+        if 'raw' in block_data and 'signature' in block_data:
+            pushed = self._pushed.setdefault(currency, {})
+            pushed[block_data['number']] = block_data
+            while len(pushed) > PUSHED_BLOCKS:
+                del pushed[min(pushed)]
+
+    def _pushed_blocks_data(self, currency, start, end, previous):
+        """
+        Get the blocks of a range from the pushed blocks
+        :return: the blocks data following the previous block, or None if some are missing
+        :rtype: List[dict]
+        """
+        if not previous:
+            return None
+        first = max(start, previous['number'] + 1)
+        pushed = self._pushed.get(currency, {})
+        blocks_data = [pushed.get(n) for n in range(first, end + 1)]
+        if blocks_data and None not in blocks_data and _chained(blocks_data, first, previous):
+            return blocks_data
+        return None
+
+    async def parse_blocks(self, blocks_data):
+        """
+        Parse blocks data out of the event loop, checking their hashes
+        :param List[dict] blocks_data: the blocks data
+        :return: the block documents, or None if a block does not match its announced hash
         :rtype: List[duniterpy.documents.Block]
         """
-        blocks = []
-        blocks_data = await self._bma_connector.get(currency, bma.blockchain.blocks, req_args={'count': 100,
-                                                                                 'start': start})
-        for data in blocks_data:
-            if data['number'] in filter or data['number'] == start+99:
-                blocks.append(Block.from_signed_raw(data["raw"] + data["signature"] + "\n"))
-
+        blocks = await self._parser.parse_blocks(blocks_data)
+        if blocks is None:
+            self._logger.debug("Blocks from {0} do not match their hashes".format(blocks_data[0]['number']))
         return blocks
 
     async def initialize_blockchain(self, currency, log_stream):
@@ -257,6 +456,7 @@ class BlockchainProcessor:
             current_block = await self._bma_connector.get(currency, bma.blockchain.current)
             signed_raw = "{0}{1}\n".format(current_block['raw'], current_block['signature'])
             block = Block.from_signed_raw(signed_raw)
+            self._headers_repo.insert_all([_block_header(currency, current_block)])
             blockchain.current_buid = block.blockUID
             blockchain.median_time = block.mediantime
             blockchain.current_members_count = block.members_count
@@ -276,6 +476,7 @@ class BlockchainProcessor:
                 block_with_ud = await self._bma_connector.get(currency, bma.blockchain.block,
                                                               req_args={'number': block_number})
                 if block_with_ud:
+                    self._headers_repo.insert_all([_block_header(currency, block_with_ud)])
                     blockchain.last_members_count = block_with_ud['membersCount']
                     blockchain.last_ud = block_with_ud['dividend']
                     blockchain.last_ud_base = block_with_ud['unitbase']
@@ -291,6 +492,7 @@ class BlockchainProcessor:
                 block_number = blocks_with_ud[index]
                 block_with_ud = await self._bma_connector.get(currency, bma.blockchain.block,
                                                               req_args={'number': block_number})
+                self._headers_repo.insert_all([_block_header(currency, block_with_ud)])
                 blockchain.previous_mass = block_with_ud['monetaryMass']
                 blockchain.previous_members_count = block_with_ud['membersCount']
                 blockchain.previous_ud = block_with_ud['dividend']
@@ -331,4 +533,5 @@ class BlockchainProcessor:
 
     def remove_blockchain(self, currency):
         self._repo.drop(self._repo.get_one(currency=currency))
+        self._headers_repo.drop_all(currency)
 
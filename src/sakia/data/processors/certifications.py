@@ -24,7 +24,7 @@ class CertificationsProcessor:
         :param sakia.app.Application app: the app
         """
         return cls(app.db.certifications_repo, app.db.identities_repo,
-                   BmaConnector(NodesProcessor(app.db.nodes_repo), app.parameters))
+                   app.bma_connector)
 
     def drop_expired(self, identity, current_ts, sig_validity, sig_window):
         """
@@ -26,7 +26,7 @@ class DividendsProcessor:
         :param sakia.app.Application app: the app
         """
         return cls(app.db.dividends_repo,
-                   BmaConnector(NodesProcessor(app.db.nodes_repo), app.parameters))
+                   app.bma_connector)
 
     def commit(self, dividend):
         try:
@@ -1,18 +1,22 @@
 import attr
-import sqlite3
+import time
 from sakia.constants import ROOT_SERVERS
 from ..entities import Node
+from ..connectors.scores import Score
 from duniterpy.documents import BlockUID, endpoint
 import logging
 
+# Seconds after which a node which did not answer is not considered synced anymore at startup
+WARM_START_AGE = 24 * 3600
+
 
 @attr.s
 class NodesProcessor:
-    _repo = attr.ib()  # :type sakia.data.repositories.NodesRepo
+    _repo = attr.ib()  # :type sakia.data.repositories.NodesRegistry
 
     @classmethod
     def instanciate(cls, app):
-        return cls(app.db.nodes_repo)
+        return cls(app.nodes_registry)
 
     def initialize_root_nodes(self, currency):
         if not self.nodes(currency):
@@ -24,14 +28,6 @@ class NodesProcessor:
                             state=Node.ONLINE)
                 self._repo.insert(node)
 
-    def current_buid(self, currency):
-        """
-        Get current buid
-        :param str currency:
-        """
-        synced_node = self._repo.get_one(currency=currency, state=Node.ONLINE)
-        return synced_node.current_buid
-
     def synced_nodes(self, currency):
         """
         Get nodes which are in the ONLINE state.
@@ -65,6 +61,18 @@ class NodesProcessor:
             self._repo.insert(node)
         return node
 
+    def update_health(self, currency, pubkey, latency, error_rate, last_limitation):
+        """
+        Saves the health scores of a node in the db
+
+        :param str currency: the currency of the node
+        :param str pubkey: the pubkey of the node
+        :param int latency: the average latency in milliseconds
+        :param float error_rate: the average ratio of failed requests
+        :param int last_limitation: the last time the node limited our requests
+        """
+        self._repo.update_health(currency, pubkey, latency, error_rate, last_limitation)
+
     def insert_node(self, node):
         """
         Update node in the repository.
@@ -79,10 +87,17 @@ class NodesProcessor:
         Saves a node state in the db
         :param sakia.data.entities.Node node: the node updated
         """
-        try:
-            self._repo.insert(node)
-        except sqlite3.IntegrityError:
+        if self._repo.get_one(currency=node.currency, pubkey=node.pubkey):
             self._repo.update(node)
+        else:
+            self._repo.insert(node)
+
+    def delete_node(self, node):
+        """
+        Removes a node from the repository
+        :param sakia.data.entities.Node node: the node to remove
+        """
+        self._repo.drop(node)
 
     def unknown_node(self, currency, pubkey):
         """
@@ -92,6 +107,39 @@ class NodesProcessor:
         other_node = self._repo.get_one(currency=currency, pubkey=pubkey)
         return other_node is None
 
+    def warm_start(self, currency):
+        """
+        Prepare the known nodes for a new start, from their state at the last run.
+        Nodes which did not answer since WARM_START_AGE are considered offline until they are refreshed,
+        so that requests are sent right away to the nodes which were synced recently.
+
+        :param str currency: the currency of the nodes
+        :return: the known nodes, the best at the last run first
+        :rtype: list[sakia.data.entities.Node]
+        """
+        now = time.time()
+        nodes = self.nodes(currency)
+        for node in nodes:
+            if node.state in (Node.ONLINE, Node.DESYNCED) and not node.root \
+                    and now - node.last_success > WARM_START_AGE:
+                node.state = Node.OFFLINE
+                self._repo.update(node)
+
+        def rank(node):
+            health = Score(node.latency, node.error_rate, node.last_limitation)
+            return node.state != Node.ONLINE, health.cost(now), -node.last_success
+
+        return sorted(nodes, key=rank)
+
+    def node(self, currency, pubkey):
+        """
+        Get a known node
+        :param str currency: the currency of the node
+        :param str pubkey: the pubkey of the node
+        :rtype: sakia.data.entities.Node
+        """
+        return self._repo.get_one(currency=currency, pubkey=pubkey)
+
     def nodes(self, currency):
         """
         Get all knew nodes.
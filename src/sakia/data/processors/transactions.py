@@ -25,7 +25,7 @@ class TransactionsProcessor:
         :param sakia.app.Application app: the app
         """
         return cls(app.db.transactions_repo,
-                   BmaConnector(NodesProcessor(app.db.nodes_repo), app.parameters))
+                   app.bma_connector)
 
     def next_txid(self, currency, block_number):
         """
@@ -120,7 +120,8 @@ class TransactionsProcessor:
         :param currency: The community target of the transaction
         """
         self._repo.insert(tx)
-        responses = await self._bma_connector.broadcast(currency, bma.tx.process, req_args={'transaction': tx.raw})
+        responses = await self._bma_connector.broadcast(currency, bma.tx.process, req_args={'transaction': tx.raw},
+                                                        first_accepted=True)
         result = await parse_bma_responses(responses)
         self.run_state_transitions(tx, [r.status for r in responses if not isinstance(r, BaseException)])
         return result, tx
@@ -0,0 +1,7 @@
+BEGIN TRANSACTION ;
+
+ALTER TABLE nodes ADD COLUMN latency INT DEFAULT 0;
+ALTER TABLE nodes ADD COLUMN error_rate FLOAT(1, 6) DEFAULT 0;
+ALTER TABLE nodes ADD COLUMN last_limitation INT DEFAULT 0;
+
+COMMIT;
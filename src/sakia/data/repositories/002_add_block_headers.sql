@@ -0,0 +1,18 @@
+BEGIN TRANSACTION ;
+
+CREATE TABLE IF NOT EXISTS block_headers(
+                               currency           VARCHAR(30),
+                               number             INT,
+                               hash               VARCHAR(100),
+                               previous_hash      VARCHAR(100),
+                               median_time        INT,
+                               dividend           INT,
+                               unit_base          INT,
+                               members_count      INT,
+                               monetary_mass      INT,
+                               PRIMARY KEY (currency, number)
+);
+
+CREATE INDEX IF NOT EXISTS block_headers_dividends ON block_headers(currency, number) WHERE dividend > 0;
+
+COMMIT;
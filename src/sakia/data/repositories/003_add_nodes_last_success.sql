@@ -0,0 +1,5 @@
+BEGIN TRANSACTION ;
+
+ALTER TABLE nodes ADD COLUMN last_success INT DEFAULT 0;
+
+COMMIT;
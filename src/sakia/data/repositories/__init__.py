@@ -7,3 +7,5 @@ from .nodes import NodesRepo
 from .connections import ConnectionsRepo
 from .sources import SourcesRepo
 from .dividends import DividendsRepo
+from .block_headers import BlockHeadersRepo
+from .nodes_registry import NodesRegistry
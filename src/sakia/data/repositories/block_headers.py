@@ -0,0 +1,54 @@
+import attr
+
+from ..entities import BlockHeader
+
+
+@attr.s(frozen=True)
+class BlockHeadersRepo:
+    """The repository for BlockHeader entities.
+    """
+    _conn = attr.ib()  # :type sqlite3.Connection
+    _primary_keys = (BlockHeader.currency, BlockHeader.number)
+
+    def insert_all(self, headers):
+        """
+        Commit block headers to the database, replacing the known ones
+        :param list[sakia.data.entities.BlockHeader] headers: the headers to commit
+        """
+        if headers:
+            values = ",".join(['?'] * len(attr.fields(BlockHeader)))
+            self._conn.executemany("INSERT OR REPLACE INTO block_headers VALUES ({0})".format(values),
+                                   [attr.astuple(h) for h in headers])
+
+    def get_one(self, currency, number):
+        """
+        Get the header of a block
+        :param str currency: the currency of the block
+        :param int number: the number of the block
+        :rtype: sakia.data.entities.BlockHeader
+        """
+        c = self._conn.execute("SELECT * FROM block_headers WHERE currency=? AND number=?", (currency, number))
+        data = c.fetchone()
+        if data:
+            return BlockHeader(*data)
+
+    def last_dividend(self, currency, number):
+        """
+        Get the header of the last block with a dividend before a given block
+        :param str currency: the currency of the block
+        :param int number: the number of the block
+        :rtype: sakia.data.entities.BlockHeader
+        """
+        c = self._conn.execute("""SELECT * FROM block_headers
+                                  WHERE currency=? AND number<=? AND dividend > 0
+                                  ORDER BY number DESC LIMIT 1""", (currency, number))
+        data = c.fetchone()
+        if data:
+            return BlockHeader(*data)
+
+    def drop_all(self, currency):
+        """
+        Drop all the headers of a currency
+        :param str currency: the currency
+        """
+        self._conn.execute("DELETE FROM block_headers WHERE currency=?", (currency,))
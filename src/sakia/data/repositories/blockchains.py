@@ -1,3 +1,4 @@
+import copy
 from typing import List
 
 import attr
@@ -8,10 +9,33 @@ from ..entities import Blockchain, BlockchainParameters
 @attr.s(frozen=True)
 class BlockchainsRepo:
     """The repository for Blockchain entities.
+
+    The blockchain of each currency is kept in memory as a snapshot, read again from the database after each change.
+    A snapshot is replaced as a whole and never modified, so that its readers always see a consistent state.
     """
     _conn = attr.ib()  # :type sqlite3.Connection
+    _snapshots = attr.ib(default=attr.Factory(dict), init=False)
     _primary_keys = (Blockchain.currency,)
 
+    @staticmethod
+    def _copy(blockchain):
+        blockchain = copy.copy(blockchain)
+        blockchain.parameters = copy.copy(blockchain.parameters)
+        return blockchain
+
+    def snapshot(self, currency):
+        """
+        Get the blockchain of a currency without requesting the database once it is known.
+        The snapshot is shared and must not be modified, use get_one to get a blockchain to update.
+        :param str currency: the currency of the blockchain
+        :rtype: sakia.data.entities.Blockchain
+        """
+        if currency not in self._snapshots:
+            c = self._conn.execute("SELECT * FROM blockchains WHERE currency=?", (currency,))
+            data = c.fetchone()
+            self._snapshots[currency] = Blockchain(BlockchainParameters(*data[:19]), *data[20:]) if data else None
+        return self._snapshots[currency]
+
     def insert(self, blockchain):
         """
         Commit a blockchain to the database
@@ -21,6 +45,7 @@ class BlockchainsRepo:
                            + attr.astuple(blockchain, filter=attr.filters.exclude(Blockchain.parameters))
         values = ",".join(['?'] * len(blockchain_tuple))
         self._conn.execute("INSERT INTO blockchains VALUES ({0})".format(values), blockchain_tuple)
+        self._snapshots.pop(blockchain.currency, None)
 
     def update(self, blockchain):
         """
@@ -47,6 +72,7 @@ class BlockchainsRepo:
                            WHERE
                           currency=?""",
                            updated_fields + where_fields)
+        self._snapshots.pop(blockchain.currency, None)
 
     def get_one(self, **search):
         """
@@ -54,6 +80,10 @@ class BlockchainsRepo:
         :param dict search: the criterions of the lookup
         :rtype: sakia.data.entities.Blockchain
         """
+        if search.keys() == {"currency"}:
+            blockchain = self.snapshot(search["currency"])
+            return self._copy(blockchain) if blockchain else None
+
         filters = []
         values = []
         for k, v in search.items():
@@ -119,3 +149,4 @@ class BlockchainsRepo:
         """
         where_fields = attr.astuple(blockchain, filter=attr.filters.include(*BlockchainsRepo._primary_keys))
         self._conn.execute("DELETE FROM blockchains WHERE currency=?", where_fields)
+        self._snapshots.pop(blockchain.currency, None)
@@ -11,6 +11,7 @@ from .transactions import TransactionsRepo
 from .dividends import DividendsRepo
 from .nodes import NodesRepo
 from .sources import SourcesRepo
+from .block_headers import BlockHeadersRepo
 
 
 @attr.s(frozen=True)
@@ -27,6 +28,7 @@ class SakiaDatabase:
     nodes_repo = attr.ib(default=None)
     sources_repo = attr.ib(default=None)
     dividends_repo = attr.ib(default=None)
+    block_headers_repo = attr.ib(default=None)
     _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
 
     @classmethod
@@ -38,7 +40,7 @@ class SakiaDatabase:
         con = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
         meta = SakiaDatabase(con, ConnectionsRepo(con), IdentitiesRepo(con),
                              BlockchainsRepo(con), CertificationsRepo(con), TransactionsRepo(con),
-                             NodesRepo(con), SourcesRepo(con), DividendsRepo(con))
+                             NodesRepo(con), SourcesRepo(con), DividendsRepo(con), BlockHeadersRepo(con))
 
         meta.prepare()
         meta.upgrade_database()
@@ -62,7 +64,10 @@ class SakiaDatabase:
     def upgrades(self):
         return [
             self.create_all_tables,
-            self.add_ud_rythm_parameters
+            self.add_ud_rythm_parameters,
+            self.add_nodes_health,
+            self.add_block_headers,
+            self.add_nodes_last_success
         ]
 
     def upgrade_database(self, to=0):
@@ -76,9 +81,17 @@ class SakiaDatabase:
             self._logger.debug("Upgrading to version {0}...".format(v))
             self.upgrades[v]()
             with self.conn:
-                self.conn.execute("UPDATE meta SET version=? WHERE id=1", (version + 1,))
+                self.conn.execute("UPDATE meta SET version=? WHERE id=1", (v + 1,))
         self._logger.debug("End upgrade of database...")
 
+    def columns(self, table):
+        """
+        Get the columns of a table
+        :param str table: the name of the table
+        :rtype: set[str]
+        """
+        return {row[1] for row in self.conn.execute("PRAGMA table_info({0})".format(table))}
+
     def create_all_tables(self):
         """
         Init all the tables
@@ -94,11 +107,51 @@ class SakiaDatabase:
         Init all the tables
         :return:
         """
+        # Databases upgraded before the fix of the meta version were left at version 1 with these columns
+        if "ud_time_0" in self.columns("blockchains"):
+            self._logger.debug("Ud rythm parameters already in blockchains table")
+            return
         self._logger.debug("Add ud rythm parameters to blockchains table")
         sql_file = open(os.path.join(os.path.dirname(__file__), '000_add_ud_rythm_parameters.sql'), 'r')
         with self.conn:
             self.conn.executescript(sql_file.read())
 
+    def add_nodes_health(self):
+        """
+        Add the health scores of the nodes
+        :return:
+        """
+        if "latency" in self.columns("nodes"):
+            self._logger.debug("Health scores already in nodes table")
+            return
+        self._logger.debug("Add health scores to nodes table")
+        sql_file = open(os.path.join(os.path.dirname(__file__), '001_add_nodes_health.sql'), 'r')
+        with self.conn:
+            self.conn.executescript(sql_file.read())
+
+    def add_block_headers(self):
+        """
+        Add the table of the blocks headers
+        :return:
+        """
+        self._logger.debug("Add block_headers table")
+        sql_file = open(os.path.join(os.path.dirname(__file__), '002_add_block_headers.sql'), 'r')
+        with self.conn:
+            self.conn.executescript(sql_file.read())
+
+    def add_nodes_last_success(self):
+        """
+        Add the last time the nodes answered
+        :return:
+        """
+        if "last_success" in self.columns("nodes"):
+            self._logger.debug("Last success already in nodes table")
+            return
+        self._logger.debug("Add last success to nodes table")
+        sql_file = open(os.path.join(os.path.dirname(__file__), '003_add_nodes_last_success.sql'), 'r')
+        with self.conn:
+            self.conn.executescript(sql_file.read())
+
     def version(self):
         with self.conn:
             c = self.conn.execute("SELECT * FROM meta WHERE id=1")
@@ -9,6 +9,8 @@ class NodesRepo:
     """
     _conn = attr.ib()  # :type sqlite3.Connection
     _primary_keys = (Node.currency, Node.pubkey)
+    # Health scores are only written by update_health
+    _health_fields = (Node.latency, Node.error_rate, Node.last_limitation)
 
     def insert(self, node):
         """
@@ -27,7 +29,8 @@ class NodesRepo:
         :param sakia.data.entities.Node node: the node to update
         """
         updated_fields = attr.astuple(node, tuple_factory=list,
-                                      filter=attr.filters.exclude(*NodesRepo._primary_keys))
+                                      filter=attr.filters.exclude(*NodesRepo._primary_keys,
+                                                                  *NodesRepo._health_fields))
         updated_fields[0] = "\n".join([str(n) for n in updated_fields[0]])
         updated_fields[10] = "\n".join([str(n) for n in updated_fields[9]])
         where_fields = attr.astuple(node, tuple_factory=list,
@@ -45,12 +48,31 @@ class NodesRepo:
                                     merkle_peers_root=?,
                                     merkle_peers_leaves=?,
                                     root=?,
-                                    member=?
+                                    member=?,
+                                    last_success=?
                                    WHERE
                                    currency=? AND
                                    pubkey=?""",
                                    updated_fields + where_fields)
 
+    def update_health(self, currency, pubkey, latency, error_rate, last_limitation):
+        """
+        Update the health scores of an existing node in the database
+        :param str currency: the currency of the node
+        :param str pubkey: the pubkey of the node
+        :param int latency: the average latency in milliseconds
+        :param float error_rate: the average ratio of failed requests
+        :param int last_limitation: the last time the node limited our requests
+        """
+        self._conn.execute("""UPDATE nodes SET
+                                    latency=?,
+                                    error_rate=?,
+                                    last_limitation=?
+                                   WHERE
+                                   currency=? AND
+                                   pubkey=?""",
+                           (latency, error_rate, last_limitation, currency, pubkey))
+
     def get_one(self, **search):
         """
         Get an existing node in the database
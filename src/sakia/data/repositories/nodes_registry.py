@@ -0,0 +1,176 @@
+import asyncio
+import copy
+import logging
+
+import attr
+
+# Seconds between a change of the registry and its write in the database
+FLUSH_DELAY = 5
+
+
+@attr.s()
+class NodesRegistry:
+    """
+    The known nodes, kept in memory and indexed by currency, state and member flag.
+    It answers like the NodesRepo it is loaded from, and writes its changes to it by batches.
+
+    Nodes are copied when they enter or leave the registry, so that the changes
+    made on a node are only known by the registry when it is updated.
+    """
+    _repo = attr.ib()  # :type sakia.data.repositories.NodesRepo
+    _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
+    _nodes = attr.ib(default=attr.Factory(dict), init=False)
+    _index = attr.ib(default=attr.Factory(dict), init=False)
+    _stored = attr.ib(default=attr.Factory(set), init=False)
+    _dirty = attr.ib(default=attr.Factory(dict), init=False)
+    _dirty_health = attr.ib(default=attr.Factory(dict), init=False)
+    _flush_handle = attr.ib(default=None, init=False)
+
+    @staticmethod
+    def _key(node):
+        return node.currency, node.pubkey
+
+    @staticmethod
+    def _index_key(node):
+        return node.currency, node.state, node.member
+
+    def load(self):
+        """
+        Load the nodes from the database, forgetting the changes not written yet
+        """
+        self._nodes.clear()
+        self._index.clear()
+        self._dirty.clear()
+        self._dirty_health.clear()
+        for node in self._repo.get_all():
+            self._add(node)
+        self._stored = set(self._nodes.keys())
+
+    def _add(self, node):
+        self._nodes[self._key(node)] = node
+        self._index.setdefault(self._index_key(node), {})[node.pubkey] = node
+
+    def _remove(self, key):
+        node = self._nodes.pop(key, None)
+        if node:
+            self._index[self._index_key(node)].pop(node.pubkey)
+        return node
+
+    def _changed(self, key, node):
+        self._dirty[key] = node
+        self._schedule_flush()
+
+    def _health_changed(self, key, health):
+        self._dirty_health[key] = health
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if not self._flush_handle:
+            try:
+                self._flush_handle = asyncio.get_event_loop().call_later(FLUSH_DELAY, self.flush)
+            except RuntimeError:
+                self.flush()
+
+    def insert(self, node):
+        """
+        Add a node to the registry
+        :param sakia.data.entities.Node node: the node to add
+        """
+        node = copy.copy(node)
+        self._remove(self._key(node))
+        self._add(node)
+        self._changed(self._key(node), node)
+
+    def update(self, node):
+        """
+        Update an existing node of the registry.
+        Its health scores are left untouched, they are only updated by update_health.
+        :param sakia.data.entities.Node node: the node to update
+        """
+        known = self._remove(self._key(node))
+        node = copy.copy(node)
+        if known:
+            node.latency, node.error_rate, node.last_limitation = \
+                known.latency, known.error_rate, known.last_limitation
+        self._add(node)
+        self._changed(self._key(node), node)
+
+    def update_health(self, currency, pubkey, latency, error_rate, last_limitation):
+        """
+        Update the health scores of an existing node
+        :param str currency: the currency of the node
+        :param str pubkey: the pubkey of the node
+        :param int latency: the average latency in milliseconds
+        :param float error_rate: the average ratio of failed requests
+        :param int last_limitation: the last time the node limited our requests
+        """
+        node = self._nodes.get((currency, pubkey))
+        if node:
+            node.latency, node.error_rate, node.last_limitation = latency, error_rate, last_limitation
+            self._health_changed((currency, pubkey), (latency, error_rate, last_limitation))
+
+    def drop(self, node):
+        """
+        Drop an existing node from the registry
+        :param sakia.data.entities.Node node: the node to drop
+        """
+        dropped = self._remove(self._key(node))
+        if dropped:
+            self._dirty_health.pop(self._key(node), None)
+            self._changed(self._key(node), dropped)
+
+    def _search(self, search):
+        if search.keys() <= {"currency", "state", "member"} and "currency" in search:
+            buckets = [nodes for (currency, state, member), nodes in self._index.items()
+                       if currency == search["currency"]
+                       and search.get("state", state) == state
+                       and search.get("member", member) == member]
+            return [n for nodes in buckets for n in nodes.values()]
+        return [n for n in self._nodes.values() if all(getattr(n, k) == v for k, v in search.items())]
+
+    def get_one(self, **search):
+        """
+        Get an existing node
+        :param dict search: the criterions of the lookup
+        :rtype: sakia.data.entities.Node
+        """
+        if search.keys() == {"currency", "pubkey"}:
+            node = self._nodes.get((search["currency"], search["pubkey"]))
+            return copy.copy(node) if node else None
+        nodes = self._search(search)
+        if nodes:
+            return copy.copy(nodes[0])
+
+    def get_all(self, **search):
+        """
+        Get all existing nodes corresponding to the search
+        :param dict search: the criterions of the lookup
+        :rtype: list[sakia.data.entities.Node]
+        """
+        return [copy.copy(n) for n in self._search(search)]
+
+    def flush(self):
+        """
+        Write the changes to the database
+        """
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for key, node in self._dirty.items():
+            if key not in self._nodes:
+                if key in self._stored:
+                    self._repo.drop(node)
+                    self._stored.discard(key)
+            elif key in self._stored:
+                self._repo.update(node)
+            else:
+                self._repo.insert(node)
+                self._stored.add(key)
+        for key, health in self._dirty_health.items():
+            if key in self._stored:
+                self._repo.update_health(*key, *health)
+        if self._dirty or self._dirty_health:
+            self._logger.debug("Saved {0} nodes changes and {1} nodes health"
+                               .format(len(self._dirty), len(self._dirty_health)))
+        self._dirty.clear()
+        self._dirty_health.clear()
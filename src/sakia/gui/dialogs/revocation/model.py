@@ -44,7 +44,8 @@ class RevocationModel(QObject):
 
     async def send_to_node(self, server, port, secured):
         signed_raw = self.revocation_document.signed_raw(self.revoked_identity)
-        node_connector = await NodeConnector.from_address(None, secured, server, port, self.app.parameters)
+        node_connector = await NodeConnector.from_address(None, secured, server, port, self.app.parameters,
+                                                          parser=self.app.documents_parser)
         for endpoint in [e for e in node_connector.node.endpoints
                          if isinstance(e, BMAEndpoint) or isinstance(e, SecuredBMAEndpoint)]:
             try:
@@ -61,6 +61,7 @@ class InformationsController(QObject):
         app.new_dividend.connect(informations.refresh_localized_data)
         app.referential_changed.connect(informations.refresh_localized_data)
         app.sources_refreshed.connect(informations.refresh_localized_data)
+        app.new_blocks_handled.connect(informations.refresh_localized_data)
         return informations
 
     @asyncify
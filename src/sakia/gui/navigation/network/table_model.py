@@ -149,7 +149,7 @@ class NetworkTableModel(QAbstractTableModel):
         self.network_service = network_service
         
         self.nodes_data = []
-        self.network_service.node_changed.connect(self.change_node)
+        self.network_service.nodes_changed.connect(self.change_nodes)
         self.network_service.node_removed.connect(self.remove_node)
         self.network_service.new_node_found.connect(self.add_node)
 
@@ -196,12 +196,22 @@ class NetworkTableModel(QAbstractTableModel):
         self.nodes_data.append(self.data_node(node))
         self.endInsertRows()
 
-    def change_node(self, node):
-        for i, n in enumerate(self.nodes_data):
-            if n[NetworkTableModel.columns_types.index('pubkey')] == node.pubkey:
+    def change_nodes(self, nodes):
+        """
+        Update the rows of changed nodes, with a single change signal
+        :param list[sakia.data.entities.Node] nodes: the changed nodes
+        """
+        pubkey_column = NetworkTableModel.columns_types.index('pubkey')
+        rows = {n[pubkey_column]: i for i, n in enumerate(self.nodes_data)}
+        changed_rows = []
+        for node in nodes:
+            if node.pubkey in rows:
+                i = rows[node.pubkey]
                 self.nodes_data[i] = self.data_node(node)
-                self.dataChanged.emit(self.index(i, 0), self.index(i, len(self.columns_types)-1))
-                return
+                changed_rows.append(i)
+        if changed_rows:
+            self.dataChanged.emit(self.index(min(changed_rows), 0),
+                                  self.index(max(changed_rows), len(self.columns_types)-1))
 
     def remove_node(self, node):
         for i, n in enumerate(self.nodes_data.copy()):
@@ -66,7 +66,8 @@ class PreferencesDialog(QDialog, Ui_PreferencesDialog):
                                     notifications=self.checkbox_notifications.isChecked(),
                                     enable_proxy=self.checkbox_proxy.isChecked(),
                                     proxy_address=self.edit_proxy_address.text(),
-                                    proxy_port=self.spinbox_proxy_port.value())
+                                    proxy_port=self.spinbox_proxy_port.value(),
+                                    max_websockets=self.app.parameters.max_websockets)
         self.app.save_parameters(parameters)
       # change UI translation
         self.app.switch_language()
@@ -4,6 +4,7 @@ import math
 import logging
 from duniterpy.api.errors import DuniterError
 from sakia.errors import NoPeerAvailable
+from .pipeline import Pipeline
 
 
 class BlockchainService(QObject):
@@ -34,57 +35,103 @@ class BlockchainService(QObject):
         self._sources_service = sources_service
         self._logger = logging.getLogger('sakia')
         self._update_lock = False
+        self._sync_pipeline = None
 
     def initialized(self):
         return self._blockchain_processor.initialized(self.app.currency)
 
+    def receive_block(self, block_data):
+        """
+        Keep a block pushed by a node, to use it during the next blockchain progress
+        :param dict block_data: the block data
+        """
+        self._blockchain_processor.receive_block(self.currency, block_data)
+
     def handle_new_blocks(self, blocks):
         self._blockchain_processor.handle_new_blocks(self.currency, blocks)
 
-    async def new_blocks(self, network_blockstamp):
-        with_identities = await self._blockchain_processor.new_blocks_with_identities(self.currency)
-        with_money = await self._blockchain_processor.new_blocks_with_money(self.currency)
-        block_numbers = with_identities + with_money
+    def new_blocks(self, network_blockstamp):
+        """
+        Get the numbers of the blocks the local blockchain must progress to.
+        The blocks changing the identities or the money are found in the data of the downloaded blocks.
+
+        :param duniterpy.documents.BlockUID network_blockstamp: the current block of the network
+        :rtype: List[int]
+        """
         if network_blockstamp > self.current_buid():
-            block_numbers += [network_blockstamp.number]
-        return block_numbers
+            return [network_blockstamp.number]
+        return []
 
     async def handle_blockchain_progress(self, network_blockstamp):
         """
-        Handle a new current block uid
+        Handle a new current block uid.
+        Blocks are downloaded, parsed and applied by the stages of a pipeline,
+        so that the next blocks are downloaded while the current ones are applied.
 
         :param duniterpy.documents.BlockUID network_blockstamp:
         """
         if self._blockchain_processor.initialized(self.currency) and not self._update_lock:
             try:
                 self._update_lock = True
-                block_numbers = await self.new_blocks(network_blockstamp)
-                while block_numbers:
-                    start = self.current_buid().number
+                block_numbers = self.new_blocks(network_blockstamp)
+                start = self.current_buid().number
+                previous = None
+
+                async def fetch():
+                    nonlocal start, previous
+                    numbers = [n for n in block_numbers if n > start]
+                    if not numbers:
+                        return None
                     self._logger.debug("Parsing from {0}".format(start))
-                    blocks = await self._blockchain_processor.next_blocks(start, block_numbers, self.currency)
-                    if len(blocks) > 0:
-                        identities = await self._identities_service.handle_new_blocks(blocks)
-                        changed_tx, new_tx, new_dividends = await self._transactions_service.handle_new_blocks(blocks)
-                        new_tx += await self._sources_service.refresh_sources(new_tx, new_dividends)
-                        self.handle_new_blocks(blocks)
-                        self.app.db.commit()
-                        for tx in changed_tx:
-                            self.app.transaction_state_changed.emit(tx)
-                        for tx in new_tx:
-                            self.app.new_transfer.emit(tx)
-                        for ud in new_dividends:
-                            self.app.new_dividend.emit(ud)
-                        for idty in identities:
-                            self.app.identity_changed.emit(idty)
-                        self.app.new_blocks_handled.emit()
-                        block_numbers = await self.new_blocks(network_blockstamp)
+                    blocks_data = await self._blockchain_processor.next_blocks_data(start, numbers,
+                                                                                    self.currency, previous,
+                                                                                    network_blockstamp)
+                    if not blocks_data or blocks_data[-1]['number'] <= start:
+                        return None
+                    start = blocks_data[-1]['number']
+                    previous = blocks_data[-1]
+                    return blocks_data
+
+                async def parse(blocks_data):
+                    return await self._blockchain_processor.parse_blocks(blocks_data)
+
+                self._sync_pipeline = Pipeline([("fetch", fetch), ("parse", parse), ("apply", self.apply_blocks)])
+                await self._sync_pipeline.run()
+                self._logger.debug("Blockchain progress :\n{0}".format(self._sync_pipeline.report()))
                 self.app.sources_refreshed.emit()
             except (NoPeerAvailable, DuniterError) as e:
                 self._logger.debug(str(e))
             finally:
                 self._update_lock = False
 
+    async def apply_blocks(self, blocks):
+        """
+        Update the local data with new blocks, and commit them
+
+        :param List[duniterpy.documents.Block] blocks: the new blocks
+        """
+        identities = await self._identities_service.handle_new_blocks(blocks)
+        changed_tx, new_tx, new_dividends = await self._transactions_service.handle_new_blocks(blocks)
+        new_tx += await self._sources_service.refresh_sources(new_tx, new_dividends)
+        self.handle_new_blocks(blocks)
+        self.app.db.commit()
+        for tx in changed_tx:
+            self.app.transaction_state_changed.emit(tx)
+        for tx in new_tx:
+            self.app.new_transfer.emit(tx)
+        for ud in new_dividends:
+            self.app.new_dividend.emit(ud)
+        for idty in identities:
+            self.app.identity_changed.emit(idty)
+        self.app.new_blocks_handled.emit()
+
+    def sync_metrics(self):
+        """
+        Get the metrics of the stages of the last blockchain progress
+        :rtype: list[sakia.services.pipeline.StageMetrics]
+        """
+        return self._sync_pipeline.metrics if self._sync_pipeline else []
+
     def current_buid(self):
         return self._blockchain_processor.current_buid(self.currency)
 
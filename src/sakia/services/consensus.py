@@ -0,0 +1,128 @@
+import attr
+from sakia.data.entities import Node
+
+
+def _block_hash(node):
+    return node.current_buid.sha_hash if node.current_buid else ""
+
+
+@attr.s()
+class ConsensusTracker:
+    """
+    The votes of the online nodes for their current block.
+    The block of the majority is kept up to date on every vote, without scanning the nodes :
+    the blocks are stored by number of votes, and a vote only moves its block by one.
+
+    When several blocks have the most votes, the current majority is kept
+    as long as it is one of them.
+    """
+    majority = attr.ib(default=None, init=False)
+    _votes = attr.ib(default=attr.Factory(dict), init=False)
+    _voters = attr.ib(default=attr.Factory(dict), init=False)
+    _by_count = attr.ib(default=attr.Factory(dict), init=False)
+    _top = attr.ib(default=0, init=False)
+
+    def _move(self, block_hash, count, new_count):
+        if block_hash:
+            bucket = self._by_count.get(count)
+            if bucket:
+                bucket.discard(block_hash)
+                if not bucket:
+                    del self._by_count[count]
+            if new_count:
+                self._by_count.setdefault(new_count, set()).add(block_hash)
+            self._top = max(self._top, new_count)
+            while self._top and self._top not in self._by_count:
+                self._top -= 1
+
+    def _add_vote(self, pubkey, block_hash):
+        voters = self._voters.setdefault(block_hash, set())
+        self._move(block_hash, len(voters), len(voters) + 1)
+        voters.add(pubkey)
+        self._votes[pubkey] = block_hash
+
+    def _remove_vote(self, pubkey):
+        block_hash = self._votes.pop(pubkey)
+        voters = self._voters[block_hash]
+        self._move(block_hash, len(voters), len(voters) - 1)
+        voters.discard(pubkey)
+        if not voters:
+            del self._voters[block_hash]
+
+    def _elect(self):
+        most_voted = self._by_count.get(self._top)
+        if not most_voted:
+            return None
+        if self.majority in most_voted:
+            return self.majority
+        return min(most_voted)
+
+    def _affected(self, previous, pubkey=None):
+        if previous == self.majority:
+            return {pubkey} if pubkey else set()
+        if previous is None or self.majority is None:
+            return set(self._votes.keys())
+        affected = self._voters.get(previous, set()) | self._voters.get(self.majority, set())
+        if pubkey:
+            affected.add(pubkey)
+        return affected
+
+    def state(self, pubkey):
+        """
+        Get the state a node should have according to the majority
+        :param str pubkey: the pubkey of the node
+        :return: the state, or None if the node does not vote
+        :rtype: int
+        """
+        if pubkey not in self._votes:
+            return None
+        if self.majority is None or self._votes[pubkey] == self.majority:
+            return Node.ONLINE
+        return Node.DESYNCED
+
+    def update(self, node):
+        """
+        Take the new state of a node into account.
+        ONLINE and DESYNCED nodes vote for their current block, others do not vote.
+        :param sakia.data.entities.Node node: the node
+        :return: the pubkeys of the nodes which state may have changed
+        :rtype: set[str]
+        """
+        previous = self.majority
+        if node.pubkey in self._votes:
+            if node.state in (Node.ONLINE, Node.DESYNCED) and self._votes[node.pubkey] == _block_hash(node):
+                return {node.pubkey}
+            self._remove_vote(node.pubkey)
+        if node.state in (Node.ONLINE, Node.DESYNCED):
+            self._add_vote(node.pubkey, _block_hash(node))
+        self.majority = self._elect()
+        return self._affected(previous, node.pubkey)
+
+    def withdraw(self, pubkey):
+        """
+        Remove the vote of a node
+        :param str pubkey: the pubkey of the node
+        :return: the pubkeys of the nodes which state may have changed
+        :rtype: set[str]
+        """
+        previous = self.majority
+        if pubkey in self._votes:
+            self._remove_vote(pubkey)
+            self.majority = self._elect()
+        return self._affected(previous)
+
+    def reset(self, nodes):
+        """
+        Count the votes of the given nodes again
+        :param list[sakia.data.entities.Node] nodes: the nodes
+        :return: the pubkeys of the nodes voting
+        :rtype: set[str]
+        """
+        self.majority = None
+        self._votes.clear()
+        self._voters.clear()
+        self._by_count.clear()
+        self._top = 0
+        for node in nodes:
+            self.update(node)
+        return set(self._votes.keys())
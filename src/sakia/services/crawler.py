@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+import attr
+
+# Maximum number of nodes refreshed at the same time
+CONCURRENCY = 8
+# Seconds a crawling pass can last
+PASS_DEADLINE = 10
+# Bounds of the seconds between two refreshes of a node
+MIN_INTERVAL = 15
+MAX_INTERVAL = 240
+
+
+@attr.s()
+class Schedule:
+    """
+    The refresh schedule of a node.
+    The interval is halved when the node changed since its last refresh, and doubled when it did not
+    or when its refresh failed.
+    """
+    interval = attr.ib(default=MIN_INTERVAL)
+    next_refresh = attr.ib(default=0)
+    fingerprint = attr.ib(default=None)
+
+    def refreshed(self, fingerprint, now):
+        if fingerprint != self.fingerprint:
+            self.interval = max(MIN_INTERVAL, self.interval / 2)
+        else:
+            self.interval = min(MAX_INTERVAL, self.interval * 2)
+        self.fingerprint = fingerprint
+        self.next_refresh = now + self.interval
+
+    def failed(self, now):
+        self.interval = min(MAX_INTERVAL, self.interval * 2)
+        self.next_refresh = now + self.interval
+
+
+@attr.s()
+class Crawler:
+    """
+    Refreshes the nodes when they are due, a bounded number at the same time.
+    A pass stops starting refreshes when its deadline is reached,
+    the nodes left being the first refreshed at the next pass.
+    A node whose refresh fails is refreshed later, without stopping the pass.
+    """
+    concurrency = attr.ib(default=CONCURRENCY)
+    deadline = attr.ib(default=PASS_DEADLINE)
+    _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
+    _schedules = attr.ib(default=attr.Factory(dict), init=False)
+
+    def schedule(self, connector):
+        """
+        Get the schedule of a node
+        :param sakia.data.connectors.NodeConnector connector: the node connector
+        :rtype: Schedule
+        """
+        return self._schedules.setdefault(connector.node.pubkey, Schedule())
+
+    def due(self, connectors, now):
+        """
+        Get the nodes to refresh, the most late first
+        :param list[sakia.data.connectors.NodeConnector] connectors: the nodes connectors
+        :param float now: the current time
+        :rtype: list[sakia.data.connectors.NodeConnector]
+        """
+        due = [c for c in connectors if self.schedule(c).next_refresh <= now]
+        return sorted(due, key=lambda c: self.schedule(c).next_refresh)
+
+    def next_pass_delay(self, connectors, now):
+        """
+        Get the seconds to wait before a node is due
+        :param list[sakia.data.connectors.NodeConnector] connectors: the nodes connectors
+        :param float now: the current time
+        :rtype: float
+        """
+        if not connectors:
+            return MIN_INTERVAL
+        return max(0, min(self.schedule(c).next_refresh for c in connectors) - now)
+
+    async def crawl(self, connectors, refresh):
+        """
+        Refresh the nodes which are due
+        :param list[sakia.data.connectors.NodeConnector] connectors: the nodes connectors
+        :param refresh: the coroutine function refreshing a node, called with the connector and a timeout
+        """
+        start = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def refresh_node(connector):
+            async with semaphore:
+                remaining = self.deadline - (time.monotonic() - start)
+                if remaining <= 0:
+                    return
+                try:
+                    await refresh(connector, remaining)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._logger.debug("Refresh of {0} failed : {1}".format(connector.node.pubkey[:5], str(e)))
+                    self.schedule(connector).failed(time.monotonic())
+                    return
+                node = connector.node
+                self.schedule(connector).refreshed((node.state, node.current_buid), time.monotonic())
+
+        await asyncio.gather(*[refresh_node(c) for c in self.due(connectors, start)])
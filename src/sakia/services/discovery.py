@@ -0,0 +1,61 @@
+import heapq
+import itertools
+import attr
+
+# Maximum number of peers waiting to be handled
+MAX_PEERS = 1000
+# Maximum number of peers handled at the same time
+BATCH_SIZE = 32
+
+# Priorities of the peers, the lowest being handled first
+UNKNOWN_NODE = 0
+MEMBER_NODE = 1
+OTHER_NODE = 2
+
+
+@attr.s()
+class DiscoveryQueue:
+    """
+    The peers documents waiting to be handled, by priority.
+    A node is queued only once : a peer already queued with the same or a more recent
+    blockstamp is ignored, a more recent one replaces it.
+    """
+    max_peers = attr.ib(default=MAX_PEERS)
+    _heap = attr.ib(default=attr.Factory(list), init=False)
+    _queued = attr.ib(default=attr.Factory(dict), init=False)
+    _counter = attr.ib(default=attr.Factory(itertools.count), init=False)
+
+    def __len__(self):
+        return len(self._queued)
+
+    def push(self, peer, priority):
+        """
+        Queue a peer document
+        :param duniterpy.documents.Peer peer: the peer document
+        :param int priority: the priority of the peer
+        :return: True if the peer was queued
+        :rtype: bool
+        """
+        queued = self._queued.get(peer.pubkey)
+        if queued is not None and not queued < peer.blockUID:
+            return False
+        if queued is None and len(self._queued) >= self.max_peers:
+            return False
+        self._queued[peer.pubkey] = peer.blockUID
+        heapq.heappush(self._heap, (priority, next(self._counter), peer))
+        return True
+
+    def pop_batch(self, size=BATCH_SIZE):
+        """
+        Get the next peers to handle
+        :param int size: the maximum number of peers
+        :rtype: list[duniterpy.documents.Peer]
+        """
+        batch = []
+        while self._heap and len(batch) < size:
+            _, _, peer = heapq.heappop(self._heap)
+            # Peers replaced by a more recent one are left in the heap until they are popped
+            if self._queued.get(peer.pubkey) == peer.blockUID:
+                del self._queued[peer.pubkey]
+                batch.append(peer)
+        return batch
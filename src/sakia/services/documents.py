@@ -43,7 +43,7 @@ class DocumentsService:
         Instanciate a blockchain processor
         :param sakia.app.Application app: the app
         """
-        return cls(BmaConnector(NodesProcessor(app.db.nodes_repo), app.parameters),
+        return cls(app.bma_connector,
                    BlockchainProcessor.instanciate(app),
                    IdentitiesProcessor.instanciate(app),
                    CertificationsProcessor.instanciate(app),
@@ -71,7 +71,8 @@ class DocumentsService:
         self._logger.debug("Key publish : {0}".format(selfcert.signed_raw()))
 
         responses = await self._bma_connector.broadcast(connection.currency, bma.wot.add,
-                                                        req_args={'identity': selfcert.signed_raw()})
+                                                        req_args={'identity': selfcert.signed_raw()},
+                                                        first_accepted=True)
         result = await parse_bma_responses(responses)
 
         if result[0]:
@@ -91,7 +92,7 @@ class DocumentsService:
         self._logger.debug("Broadcasting : \n" + signed_raw)
         responses = await self._bma_connector.broadcast(currency, bma.wot.revoke, req_args={
                                                             'revocation': signed_raw
-                                                        })
+                                                        }, first_accepted=True)
 
         result = False, ""
         for r in responses:
@@ -127,7 +128,8 @@ class DocumentsService:
         membership.sign([key])
         self._logger.debug("Membership : {0}".format(membership.signed_raw()))
         responses = await self._bma_connector.broadcast(connection.currency, bma.blockchain.membership,
-                                                        req_args={'membership': membership.signed_raw()})
+                                                        req_args={'membership': membership.signed_raw()},
+                                                        first_accepted=True)
         result = await parse_bma_responses(responses)
 
         return result
@@ -161,7 +163,8 @@ class DocumentsService:
         signed_cert = certification.signed_raw(identity.document())
         self._logger.debug("Certification : {0}".format(signed_cert))
         timestamp = self._blockchain_processor.time(connection.currency)
-        responses = await self._bma_connector.broadcast(connection.currency, bma.wot.certify, req_args={'cert': signed_cert})
+        responses = await self._bma_connector.broadcast(connection.currency, bma.wot.certify,
+                                                        req_args={'cert': signed_cert}, first_accepted=True)
         result = await parse_bma_responses(responses)
         if result[0]:
             self._identities_processor.insert_or_update_identity(identity)
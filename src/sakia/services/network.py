@@ -1,15 +1,23 @@
 import asyncio
 import logging
 import time
-from collections import Counter
 
 from PyQt5.QtCore import pyqtSignal, pyqtSlot, QObject, Qt
 from duniterpy.api import errors
-from duniterpy.key import VerifyingKey
 from sakia.data.connectors import NodeConnector
 from sakia.data.entities import Node
+from sakia.data.parser import PeersVerifier
 from sakia.decorators import asyncify
 from sakia.errors import InvalidNodeCurrency
+from .crawler import Crawler
+from .consensus import ConsensusTracker
+from .discovery import DiscoveryQueue, UNKNOWN_NODE, MEMBER_NODE, OTHER_NODE
+from .websockets import WebsocketsBudget
+
+# Seconds the nodes states changes are gathered before being saved and displayed
+STATES_DELAY = 1
+# Seconds the nodes changes are gathered before being sent to the views
+CHANGES_DELAY = 0.1
 
 
 class NetworkService(QObject):
@@ -17,7 +25,7 @@ class NetworkService(QObject):
     A network is managing nodes polling and crawling of a
     given community.
     """
-    node_changed = pyqtSignal(Node)
+    nodes_changed = pyqtSignal(list)
     new_node_found = pyqtSignal(Node)
     node_removed = pyqtSignal(Node)
     root_nodes_changed = pyqtSignal()
@@ -38,15 +46,25 @@ class NetworkService(QObject):
         self._logger = logging.getLogger('sakia')
         self._processor = node_processor
         self._connectors = []
+        self._connectors_by_pubkey = {}
         for c in connectors:
             self.add_connector(c)
         self.currency = currency
         self._must_crawl = False
         self._block_found = self._processor.current_buid(self.currency)
-        self._discovery_stack = []
+        self._discovery_queue = DiscoveryQueue()
+        self._verifier = PeersVerifier(app.documents_parser)
         self._blockchain_service = blockchain_service
         self._identities_service = identities_service
         self._discovery_loop_task = None
+        self._crawler = Crawler()
+        self._websockets = WebsocketsBudget(app.parameters.max_websockets, app.bma_connector)
+        self._consensus = ConsensusTracker()
+        self._consensus.reset(self._processor.online_nodes(self.currency))
+        self._pending_states = set()
+        self._states_handle = None
+        self._changed_nodes = {}
+        self._changes_handle = None
 
     @classmethod
     def create(cls, node_processor, node_connector):
@@ -67,7 +85,7 @@ class NetworkService(QObject):
     @classmethod
     def load(cls, app, currency, node_processor, blockchain_service, identities_service):
         """
-        Create a new network with all known nodes
+        Create a new network with all known nodes, the best nodes at the last run being refreshed first
 
         :param sakia.app.Application app: Sakia application
         :param str currency: The currency of this service
@@ -76,8 +94,8 @@ class NetworkService(QObject):
         """
 
         connectors = []
-        for node in node_processor.nodes(currency):
-            connectors.append(NodeConnector(node, app.parameters))
+        for node in node_processor.warm_start(currency):
+            connectors.append(NodeConnector(node, app.parameters, parser=app.documents_parser))
         network = cls(app, currency, node_processor, connectors, blockchain_service, identities_service)
         return network
 
@@ -96,6 +114,14 @@ class NetworkService(QObject):
         """
         return self._processor.nodes(self.currency)
 
+    def majority_block(self):
+        """
+        Get the hash of the current block of the majority of the online nodes
+        :return: the block hash, or None if no online node has a block
+        :rtype: str
+        """
+        return self._consensus.majority
+
     def commit_node(self, node):
         self._processor.commit_node(node)
 
@@ -104,6 +130,11 @@ class NetworkService(QObject):
         Stop network nodes crawling.
         """
         self._must_crawl = False
+        self.save_states()
+        self.send_changes()
+        # The last known state of the nodes is used at the next start
+        for connector in self._connectors:
+            self._processor.update_node(connector.node)
         close_tasks = []
         self._logger.debug("Start closing")
         for connector in self._connectors:
@@ -118,67 +149,87 @@ class NetworkService(QObject):
 
     def check_nodes_sync(self, node):
         """
-        Check nodes sync with the following rules :
-        1 : The block of the majority
-        2 : The more last different issuers
-        3 : The more difficulty
-        4 : The biggest number or timestamp
-        """
-        online_nodes = self._processor.online_nodes(self.currency)
-        # rule number 1 : block of the majority
-        blocks = [n.current_buid.sha_hash for n in online_nodes if n.current_buid.sha_hash]
-        blocks_occurences = Counter(blocks)
-        blocks_by_occurences = {}
-        for key, value in blocks_occurences.items():
-            the_block = [n.current_buid.sha_hash
-                         for n in online_nodes if n.current_buid.sha_hash == key][0]
-            if value not in blocks_by_occurences:
-                blocks_by_occurences[value] = [the_block]
-            else:
-                blocks_by_occurences[value].append(the_block)
-
-        if len(blocks_by_occurences) == 0:
-            for n in [n for n in online_nodes if n.state in (Node.ONLINE, Node.DESYNCED)]:
-                if n.state != Node.ONLINE:
-                    n.state = Node.ONLINE
-                    self._processor.update_node(n)
-                    self.node_changed.emit(n)
-                if n == node:
-                    node.state = n.state
+        Check nodes sync : the nodes on the block of the majority are ONLINE, the others are DESYNCED.
+        The votes are counted incrementally, the states of the other nodes being
+        saved and displayed by batches while the majority does not change.
+
+        :param sakia.data.entities.Node node: the node which changed, or None to count all the votes again
+        """
+        majority = self._consensus.majority
+        if node:
+            pubkeys = self._consensus.update(node)
+            state = self._consensus.state(node.pubkey)
+            if state:
+                node.state = state
+            pubkeys.discard(node.pubkey)
+            self._pending_states.discard(node.pubkey)
         else:
-            most_present = max(blocks_by_occurences.keys())
-
-            synced_block_hash = blocks_by_occurences[most_present][0]
-
-            for n in online_nodes:
-                if n.current_buid.sha_hash == synced_block_hash:
-                    if n.state != Node.ONLINE:
-                        n.state = Node.ONLINE
-                        self.node_changed.emit(n)
-                elif n.state != Node.DESYNCED:
-                    n.state = Node.DESYNCED
-                    self.node_changed.emit(n)
-                    self._processor.update_node(n)
-                if n == node:
-                    node.state = n.state
+            pubkeys = self._consensus.reset(self._processor.online_nodes(self.currency))
+        self._pending_states |= pubkeys
+        # The states are saved at once when the majority changes, so that the current block
+        # of the synced nodes is the one of the new majority when the node change is handled
+        if not node or self._consensus.majority != majority:
+            self.save_states()
+        elif self._pending_states and not self._states_handle:
+            self._states_handle = asyncio.get_event_loop().call_later(STATES_DELAY, self.save_states)
         return node
 
+    def save_states(self):
+        """
+        Save and display the states changed since the last call
+        """
+        if self._states_handle:
+            self._states_handle.cancel()
+            self._states_handle = None
+        for pubkey in self._pending_states:
+            state = self._consensus.state(pubkey)
+            connector = self._connectors_by_pubkey.get(pubkey)
+            node = connector.node if connector else self._processor.node(self.currency, pubkey)
+            if state and node and node.state != state:
+                node.state = state
+                self._processor.update_node(node)
+                self.node_changed(node)
+        self._pending_states.clear()
+
+    def node_changed(self, node):
+        """
+        Send a changed node to the views, the changes being gathered during CHANGES_DELAY
+        :param sakia.data.entities.Node node: the node which changed
+        """
+        self._changed_nodes[node.pubkey] = node
+        if not self._changes_handle:
+            self._changes_handle = asyncio.get_event_loop().call_later(CHANGES_DELAY, self.send_changes)
+
+    def send_changes(self):
+        """
+        Send the nodes changed since the last call
+        """
+        if self._changes_handle:
+            self._changes_handle.cancel()
+            self._changes_handle = None
+        if self._changed_nodes:
+            nodes = list(self._changed_nodes.values())
+            self._changed_nodes.clear()
+            self.nodes_changed.emit(nodes)
+
     def add_connector(self, node_connector):
         """
         Add a nod to the network.
         """
         self._connectors.append(node_connector)
+        self._connectors_by_pubkey[node_connector.node.pubkey] = node_connector
         node_connector.changed.connect(self.handle_change, type=Qt.UniqueConnection|Qt.QueuedConnection)
         node_connector.error.connect(self.handle_error, type=Qt.UniqueConnection|Qt.QueuedConnection)
         node_connector.identity_changed.connect(self.handle_identity_change, type=Qt.UniqueConnection|Qt.QueuedConnection)
         node_connector.neighbour_found.connect(self.handle_new_node, type=Qt.UniqueConnection|Qt.QueuedConnection)
+        node_connector.block_found.connect(self.handle_block_found, type=Qt.UniqueConnection|Qt.QueuedConnection)
         self._logger.debug("{:} connected".format(node_connector.node.pubkey[:5]))
 
     @asyncify
     async def refresh_once(self):
         for connector in self._connectors:
             await asyncio.sleep(1)
-            await connector.init_session()
+            await connector.init_session(self._app.bma_connector.session())
             connector.refresh(manual=True)
 
     async def discover_network(self):
@@ -187,90 +238,114 @@ class NetworkService(QObject):
         To stop this crawling, call "stop_crawling" method.
         """
         self._must_crawl = True
-        first_loop = True
         asyncio.ensure_future(self.discovery_loop())
         while self.continue_crawling():
-            for connector in self._connectors:
-                if self.continue_crawling():
-                    await connector.init_session()
-                    connector.refresh()
-                    if not first_loop:
-                        await asyncio.sleep(15)
-            first_loop = False
-            await asyncio.sleep(15)
+            self._websockets.assign(self._connectors)
+            await self._crawler.crawl(list(self._connectors), self.refresh_connector)
+            await asyncio.sleep(max(1, self._crawler.next_pass_delay(self._connectors, time.monotonic())))
 
         self._logger.debug("End of network discovery")
 
+    async def refresh_connector(self, connector, timeout):
+        """
+        Refresh a node during the crawling
+        :param sakia.data.connectors.NodeConnector connector: the node connector
+        :param float timeout: the maximum seconds to wait for the node
+        """
+        if self.continue_crawling():
+            await connector.init_session(self._app.bma_connector.session())
+            await connector.poll(timeout)
+
     async def discovery_loop(self):
         """
-        Handle poping of nodes in discovery stack
+        Handle the peers of the discovery queue, by batches
         :return:
         """
         while self.continue_crawling():
-            try:
+            peers = self._discovery_queue.pop_batch()
+            if not peers:
                 await asyncio.sleep(1)
-                peer = self._discovery_stack.pop()
-                node, updated = self._processor.update_peer(self.currency, peer)
-                if not node:
-                    self._logger.debug("New node found : {0}".format(peer.pubkey[:5]))
-                    try:
-                        connector = NodeConnector.from_peer(self.currency, peer, self._app.parameters)
-                        node = connector.node
-                        self._processor.insert_node(connector.node)
-                        await connector.init_session()
-                        connector.refresh(manual=True)
-                        self.add_connector(connector)
-                        self.new_node_found.emit(node)
-                    except InvalidNodeCurrency as e:
-                        self._logger.debug(str(e))
-                if node and updated and self._blockchain_service.initialized():
-                    connector = next(conn for conn in self._connectors if conn.node == node)
-                    connector.refresh_summary()
-                    try:
-                        identity = await self._identities_service.find_from_pubkey(node.pubkey)
-                        identity = await self._identities_service.load_requirements(identity)
-                        node.member = identity.member
-                        node.uid = identity.uid
-                        self._processor.update_node(node)
-                        self.node_changed.emit(node)
-                    except errors.DuniterError as e:
-                        self._logger.error(e.message)
-
-                self._app.db.commit()
-            except IndexError:
-                await asyncio.sleep(2)
-
-    def handle_new_node(self, peer):
-        key = VerifyingKey(peer.pubkey)
-        if key.verify_document(peer):
-            if len(self._discovery_stack) < 1000 \
-               and peer.signatures[0] not in [p.signatures[0] for p in self._discovery_stack]:
-                self._logger.debug("Stacking new peer document : {0}".format(peer.pubkey))
-                self._discovery_stack.append(peer)
+                continue
+            await asyncio.gather(*[self.handle_peer(peer) for peer in peers])
+            self._app.db.commit()
+
+    async def handle_peer(self, peer):
+        """
+        Add or update the node of a discovered peer
+        :param duniterpy.documents.Peer peer: the peer document
+        """
+        node, updated = self._processor.update_peer(self.currency, peer)
+        if not node:
+            self._logger.debug("New node found : {0}".format(peer.pubkey[:5]))
+            try:
+                connector = NodeConnector.from_peer(self.currency, peer, self._app.parameters,
+                                                    parser=self._app.documents_parser)
+                # The node is polled until the next crawling pass gives it a websocket or not
+                connector.use_websockets = False
+                node = connector.node
+                self._processor.insert_node(connector.node)
+                await connector.init_session(self._app.bma_connector.session())
+                connector.refresh(manual=True)
+                self.add_connector(connector)
+                self.new_node_found.emit(node)
+            except InvalidNodeCurrency as e:
+                self._logger.debug(str(e))
+        if node and updated and self._blockchain_service.initialized():
+            connector = self._connectors_by_pubkey.get(node.pubkey)
+            if connector:
+                connector.refresh_summary()
+            try:
+                identity = await self._identities_service.find_from_pubkey(node.pubkey)
+                identity = await self._identities_service.load_requirements(identity)
+                node.member = identity.member
+                node.uid = identity.uid
+                self._processor.update_node(node)
+                self.node_changed(node)
+            except errors.DuniterError as e:
+                self._logger.error(e.message)
+
+    @asyncify
+    async def handle_new_node(self, peer):
+        if await self._verifier.verify(peer):
+            node = self._processor.node(self.currency, peer.pubkey)
+            if node and not node.peer_blockstamp < peer.blockUID:
+                return
+            if not node:
+                priority = UNKNOWN_NODE
+            elif node.member:
+                priority = MEMBER_NODE
+            else:
+                priority = OTHER_NODE
+            if self._discovery_queue.push(peer, priority):
+                self._logger.debug("Queuing new peer document : {0}".format(peer.pubkey))
         else:
             self._logger.debug("Wrong document received : {0}".format(peer.signed_raw()))
 
+    @pyqtSlot(dict)
+    def handle_block_found(self, block_data):
+        self._blockchain_service.receive_block(block_data)
+
     @pyqtSlot()
     def handle_identity_change(self):
         connector = self.sender()
         self._processor.update_node(connector.node)
-        self.node_changed.emit(connector.node)
+        self.node_changed(connector.node)
 
     @pyqtSlot()
     def handle_error(self):
         node = self.sender()
         if node.state in (Node.OFFLINE, Node.CORRUPTED) and  node.last_change + 3600 < time.time():
             node.disconnect()
+            self._pending_states |= self._consensus.withdraw(node.node.pubkey)
             self._processor.delete_node(node)
             self.node_removed.emit(node)
 
     def handle_change(self):
         node_connector = self.sender()
 
-        if node_connector.node.state in (Node.ONLINE, Node.DESYNCED):
-            node_connector.node = self.check_nodes_sync(node_connector.node)
+        node_connector.node = self.check_nodes_sync(node_connector.node)
         self._processor.update_node(node_connector.node)
-        self.node_changed.emit(node_connector.node)
+        self.node_changed(node_connector.node)
 
         if node_connector.node.state == Node.ONLINE:
             current_buid = self._processor.current_buid(self.currency)
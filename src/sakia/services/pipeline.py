@@ -0,0 +1,115 @@
+import asyncio
+import attr
+import time
+
+
+@attr.s()
+class StageMetrics:
+    """
+    The activity of a pipeline stage
+    """
+    name = attr.ib()
+    batches = attr.ib(default=0)
+    items = attr.ib(default=0)
+    # Seconds spent processing batches
+    busy = attr.ib(default=0.)
+    # Seconds spent waiting for batches from the previous stage
+    idle = attr.ib(default=0.)
+    # Number of batches waiting in the queue of the stage
+    queue_depth = attr.ib(default=0)
+    max_queue_depth = attr.ib(default=0)
+
+    def throughput(self):
+        """
+        Get the number of items processed per second of work
+        :rtype: float
+        """
+        return self.items / self.busy if self.busy else 0
+
+    def __str__(self):
+        return "{0} : {1} items in {2} batches, {3:.1f} items/s, busy {4:.2f}s, idle {5:.2f}s, " \
+               "queue {6}/{7}".format(self.name, self.items, self.batches, self.throughput(),
+                                      self.busy, self.idle, self.queue_depth, self.max_queue_depth)
+
+
+@attr.s()
+class Pipeline:
+    """
+    Runs batches through stages linked by bounded queues, so that every stage
+    works on its own batch at the same time.
+
+    The first stage is called without arguments and returns the next batch, or None when it is finished.
+    The next stages are called with a batch and return the batch given to the following stage,
+    or None to end the pipeline. The value returned by the last stage is ignored.
+    """
+    _stages = attr.ib()  # :type list[(str, callable)]
+    _queue_size = attr.ib(default=2)
+    metrics = attr.ib(init=False)
+
+    def __attrs_post_init__(self):
+        self.metrics = [StageMetrics(name) for name, _ in self._stages]
+
+    async def run(self):
+        """
+        Run the stages until the first one is finished and every batch went through the last one.
+        If a stage fails, the batches it already produced go through the next stages before its error is raised.
+        """
+        queues = [asyncio.Queue(maxsize=self._queue_size) for _ in self._stages[1:]]
+        tasks = []
+        for index, (name, stage) in enumerate(self._stages):
+            inbox = queues[index - 1] if index > 0 else None
+            outbox = queues[index] if index < len(queues) else None
+            tasks.append(asyncio.ensure_future(self._run_stage(index, stage, inbox, outbox)))
+        try:
+            await asyncio.wait([tasks[-1]])
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception():
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _run_stage(self, index, stage, inbox, outbox):
+        metrics = self.metrics[index]
+        try:
+            while True:
+                if inbox:
+                    start = time.monotonic()
+                    batch = await inbox.get()
+                    metrics.idle += time.monotonic() - start
+                    metrics.queue_depth = inbox.qsize()
+                    if batch is None:
+                        break
+                    start = time.monotonic()
+                    result = await stage(batch)
+                    metrics.items += len(batch)
+                else:
+                    start = time.monotonic()
+                    result = await stage()
+                    if result is None:
+                        break
+                    metrics.items += len(result)
+                metrics.busy += time.monotonic() - start
+                metrics.batches += 1
+                if outbox:
+                    if result is None:
+                        break
+                    await outbox.put(result)
+                    next_metrics = self.metrics[index + 1]
+                    next_metrics.queue_depth = outbox.qsize()
+                    next_metrics.max_queue_depth = max(next_metrics.max_queue_depth, outbox.qsize())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if outbox:
+                await outbox.put(None)
+            raise
+        if outbox:
+            await outbox.put(None)
+
+    def report(self):
+        """
+        Get the metrics of the stages
+        :rtype: str
+        """
+        return "\n".join(str(m) for m in self.metrics)
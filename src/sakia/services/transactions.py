@@ -1,6 +1,5 @@
 from PyQt5.QtCore import QObject
 from sakia.data.entities.transaction import parse_transaction_doc
-from duniterpy.documents import Transaction as TransactionDoc
 from duniterpy.documents import SimpleTransaction, Block
 from sakia.data.entities import Dividend
 from duniterpy.api import bma
@@ -14,7 +13,7 @@ class TransactionsService(QObject):
     to update data locally
     """
     def __init__(self, currency, transactions_processor, dividends_processor,
-                 identities_processor, connections_processor, bma_connector):
+                 identities_processor, connections_processor, bma_connector, documents_parser):
         """
         Constructor the identities service
 
@@ -24,6 +23,7 @@ class TransactionsService(QObject):
         :param sakia.data.processors.DividendsProcessor dividends_processor: the dividends processor for given currency
         :param sakia.data.processors.ConnectionsProcessor connections_processor: the connections processor for given currency
         :param sakia.data.connectors.BmaConnector bma_connector: The connector to BMA API
+        :param sakia.data.parser.DocumentsParser documents_parser: The parser of documents
         """
         super().__init__()
         self._transactions_processor = transactions_processor
@@ -31,6 +31,7 @@ class TransactionsService(QObject):
         self._identities_processor = identities_processor
         self._connections_processor = connections_processor
         self._bma_connector = bma_connector
+        self._parser = documents_parser
         self.currency = currency
         self._logger = logging.getLogger('sakia')
 
@@ -91,6 +92,7 @@ class TransactionsService(QObject):
         min_block_number = blocks[0].number
         max_block_number = blocks[-1].number
         dividends = []
+        txdocs = await self._parser.parse_transactions([tx.raw for tx in transactions])
         for pubkey in connections_pubkeys:
             history_data = await self._bma_connector.get(self.currency, bma.ud.history,
                                                          req_args={'pubkey': pubkey})
@@ -108,8 +110,7 @@ class TransactionsService(QObject):
                     if self._dividends_processor.commit(dividend):
                         dividends.append(dividend)
 
-            for tx in transactions:
-                txdoc = TransactionDoc.from_signed_raw(tx.raw)
+            for txdoc in txdocs:
                 for input in txdoc.inputs:
                     # For each dividends inputs, if it is consumed (not present in ud history)
                     if input.source == "D" and input.origin_id == pubkey and input.index not in block_numbers:
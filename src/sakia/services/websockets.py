@@ -0,0 +1,39 @@
+import heapq
+import time
+import attr
+from sakia.data.connectors.scores import Scoreboard
+from sakia.data.entities import Node
+
+
+@attr.s()
+class WebsocketsBudget:
+    """
+    Chooses the nodes listened through websockets : only the best nodes are,
+    the other nodes being polled on the crawler schedule.
+    Online member nodes come first, then the nodes already listened, then the healthiest nodes.
+    """
+    max_nodes = attr.ib()
+    # Gives the current health of the nodes, measured by the requests sent to them
+    _scores = attr.ib(default=attr.Factory(Scoreboard))  # :type sakia.data.connectors.BmaConnector
+
+    def _rank(self, connector, now):
+        node = connector.node
+        health = self._scores.score(node)
+        return node.state != Node.ONLINE, not node.member, not connector.use_websockets, health.cost(now)
+
+    def assign(self, connectors):
+        """
+        Open the websockets of the best nodes and close the others
+        :param list[sakia.data.connectors.NodeConnector] connectors: the nodes connectors
+        :return: the connectors listened through websockets
+        :rtype: list[sakia.data.connectors.NodeConnector]
+        """
+        now = time.time()
+        best = heapq.nsmallest(self.max_nodes, connectors, key=lambda c: self._rank(c, now))
+        listened = set(id(c) for c in best)
+        for connector in connectors:
+            if id(connector) in listened:
+                connector.use_websockets = True
+            elif connector.use_websockets:
+                connector.stop_websockets()
+        return best
@@ -0,0 +1,117 @@
+"""
+Micro-benchmark of the hash used to compare the answers of the nodes in BmaConnector.verified_get
+
+Run it with : python tests/benchmarks/bench_bma_digest.py
+"""
+import copy
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'src')))
+
+from duniterpy.api import bma
+from sakia.data.connectors.bma import canonical_digest, VOLATILE_FIELDS
+
+
+def legacy_make_hash(o):
+    """
+    The hash used before canonical_digest
+    """
+    if isinstance(o, (set, tuple, list)):
+        return tuple(sorted([legacy_make_hash(e) for e in o]))
+    elif not isinstance(o, dict):
+        return hash(o)
+
+    new_o = copy.deepcopy(o)
+    for k, v in new_o.items():
+        new_o[k] = legacy_make_hash(v)
+
+    return hash(tuple(frozenset(sorted(new_o.items()))))
+
+
+def legacy_filter_data(request, data):
+    """
+    The filter of volatile fields used before canonical_digest
+    """
+    filtered = data
+    if request is bma.tx.history:
+        filtered = copy.deepcopy(data)
+        filtered["history"].pop("sending")
+        filtered["history"].pop("receiving")
+        filtered["history"].pop("pending")
+    elif request is bma.wot.requirements:
+        filtered = copy.deepcopy(data)
+        for idty in filtered["identities"]:
+            for c in idty["certifications"]:
+                c.pop("expiresIn")
+            idty.pop('membershipPendingExpiresIn')
+    return filtered
+
+
+def tx_history(nb_tx):
+    def tx(i):
+        return {
+            "version": 10,
+            "locktime": 0,
+            "blockstamp": "{0}-000031D0C7F53E4D8E35CAD22A11EAA99232F7FC79A2C12F25BF46330136FDB8".format(i),
+            "blockstampTime": 1488019194 + i,
+            "issuers": ["7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ"],
+            "inputs": ["{0}:0:D:7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ:{1}".format(100 + i, i)],
+            "outputs": ["{0}:0:SIG(FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn)".format(i),
+                        "{0}:0:SIG(7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ)".format(100 - i % 100)],
+            "unlocks": ["0:SIG(0)"],
+            "signatures": ["42yQm4hGTJYWkPg39hQAUgP6S6EQ4vTfXdJuxKEHL1ih6YHiDL2hcwrFgBHjXLRgxRhj2VNVqqc6b4JayKqTE14r"],
+            "comment": "transfer {0}".format(i),
+            "hash": "{0:064X}".format(i),
+            "time": 1488019194 + i,
+            "block_number": i
+        }
+    return {
+        "currency": "g1",
+        "pubkey": "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+        "history": {
+            "sent": [tx(i) for i in range(0, nb_tx // 2)],
+            "received": [tx(i) for i in range(nb_tx // 2, nb_tx)],
+            "sending": [],
+            "receiving": [],
+            "pending": []
+        }
+    }
+
+
+def requirements(nb_certs):
+    return {
+        "identities": [{
+            "pubkey": "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+            "uid": "doe",
+            "meta": {"timestamp": "0-E3B0C44298FC1C149AFBF4C8996FB92427AE41E4649B934CA495991B7852B855"},
+            "revoked": False,
+            "revocation_sig": None,
+            "outdistanced": False,
+            "certifications": [{"from": "{0:044d}".format(i),
+                                "to": "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                                "expiresIn": 1000 + i} for i in range(0, nb_certs)],
+            "membershipPendingExpiresIn": 0,
+            "membershipExpiresIn": 1000
+        }]
+    }
+
+
+def bench(name, request, data, number):
+    legacy = timeit.timeit(lambda: legacy_make_hash(legacy_filter_data(request, data)), number=number)
+    digest = timeit.timeit(lambda: canonical_digest(data, VOLATILE_FIELDS.get(request, frozenset())),
+                           number=number)
+    print("{0:<28} legacy : {1:8.2f} ms   digest : {2:8.2f} ms   x{3:.1f}".format(name,
+                                                                            legacy * 1000 / number,
+                                                                            digest * 1000 / number,
+                                                                            legacy / digest))
+
+
+if __name__ == '__main__':
+    for nb_tx in (10, 100, 1000):
+        bench("tx.history {0} tx".format(nb_tx), bma.tx.history, tx_history(nb_tx), 20)
+    for nb_certs in (10, 100):
+        bench("wot.requirements {0} certs".format(nb_certs), bma.wot.requirements, requirements(nb_certs), 50)
+    bench("blockchain.ud 10000 blocks", bma.blockchain.ud, {"currency": "g1",
+                                                             "result": {"blocks": list(range(0, 10000))}}, 50)
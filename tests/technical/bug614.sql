@@ -1,5 +1,6 @@
 BEGIN TRANSACTION;
-INSERT INTO `nodes` VALUES
+INSERT INTO `nodes` (currency, pubkey, endpoints, peer_buid, uid, current_buid, current_ts, previous_buid, state,
+                     software, version, merkle_peers_root, merkle_peers_leaves, root, member) VALUES
   ('test_currency', 'C4orqutdb3Nveur3xN5L2TduT1j8d2EZkJsWLmWuD2Sv', 'BASIC_MERKLED_API test_currency.duniter.org 51.255.197.83 10900',
             '9054-00003468F74C3DE28CEF22A99C4070D092E299C890DC79E022643CB6E650A0C3', '',
             '9085-0000062A0C58E559FA9307DC13C48D00F2D3CA2D76AF07254F0BCB1E2AA9DBBE', 1488019194,
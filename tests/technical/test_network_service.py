@@ -10,6 +10,7 @@ async def test_bug_614(application_with_one_connection, fake_server, bob, alice)
     sql_file = open(os.path.join(os.path.dirname(__file__), 'bug614.sql'), 'r')
     with application_with_one_connection.db.conn:
         application_with_one_connection.db.conn.executescript(sql_file.read())
+    application_with_one_connection.nodes_registry.load()
     application_with_one_connection.network_service.check_nodes_sync(None)
     nodes = NodesProcessor.instanciate(application_with_one_connection).nodes("test_currency")
     for n in [node for node in nodes
@@ -0,0 +1,28 @@
+from sakia.data.repositories import BlockHeadersRepo
+from sakia.data.entities import BlockHeader
+
+
+def test_add_get_drop_headers(meta_repo):
+    headers_repo = BlockHeadersRepo(meta_repo.conn)
+    headers_repo.insert_all([BlockHeader("testcurrency", 10, "HASH10", "HASH9", 1346543453, 1565, 1, 12, 50000),
+                             BlockHeader("testcurrency", 11, "HASH11", "HASH10", 1346543553, 0, 1, 12, 50000)])
+    header = headers_repo.get_one("testcurrency", 11)
+    assert header.hash == "HASH11"
+    assert header.previous_hash == "HASH10"
+    assert header.median_time == 1346543553
+    assert header.dividend == 0
+    assert header.members_count == 12
+    assert header.monetary_mass == 50000
+
+    headers_repo.drop_all("testcurrency")
+    assert headers_repo.get_one("testcurrency", 11) is None
+
+
+def test_last_dividend(meta_repo):
+    headers_repo = BlockHeadersRepo(meta_repo.conn)
+    headers_repo.insert_all([BlockHeader("testcurrency", 10, "HASH10", "HASH9", 1346543453, 1565, 1, 12, 50000),
+                             BlockHeader("testcurrency", 11, "HASH11", "HASH10", 1346543553, 0, 1, 12, 50000),
+                             BlockHeader("testcurrency", 20, "HASH20", "HASH19", 1346553453, 1570, 1, 12, 70000)])
+    assert headers_repo.last_dividend("testcurrency", 15).number == 10
+    assert headers_repo.last_dividend("testcurrency", 20).dividend == 1570
+    assert headers_repo.last_dividend("testcurrency", 9) is None
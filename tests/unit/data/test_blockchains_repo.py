@@ -204,6 +204,28 @@ def test_add_update_blockchain(meta_repo):
     assert 30 == blockchain2.current_members_count
 
 
+def test_blockchain_snapshot(meta_repo):
+    blockchains_repo = BlockchainsRepo(meta_repo.conn)
+    assert blockchains_repo.snapshot("testcurrency") is None
+    blockchains_repo.insert(Blockchain(BlockchainParameters(0.1, 86400, 100000),
+                                       current_members_count=10,
+                                       currency="testcurrency"))
+    snapshot = blockchains_repo.snapshot("testcurrency")
+    assert snapshot.current_members_count == 10
+    assert blockchains_repo.snapshot("testcurrency") is snapshot
+
+    blockchain = blockchains_repo.get_one(currency="testcurrency")
+    blockchain.current_members_count = 30
+    # The snapshot is not modified until the blockchain is updated
+    assert blockchains_repo.snapshot("testcurrency").current_members_count == 10
+    blockchains_repo.update(blockchain)
+    assert snapshot.current_members_count == 10
+    assert blockchains_repo.snapshot("testcurrency").current_members_count == 30
+
+    blockchains_repo.drop(blockchain)
+    assert blockchains_repo.snapshot("testcurrency") is None
+
+
 @pytest.mark.parametrize('meta_repo', [0], indirect=True)
 def test_update_blockchain_table_to_v2(meta_repo):
     blockchains_repo = BlockchainsRepo(meta_repo.conn)
@@ -245,3 +267,19 @@ def test_update_blockchain_table_to_v2(meta_repo):
     blockchain2 = blockchains_repo.get_one(currency="testcurrency")
     assert 0 == blockchain2.parameters.ud_time_0
 
+
+
+def test_upgrade_version_1_database_with_ud_rythm(meta_repo):
+    blockchains_repo = BlockchainsRepo(meta_repo.conn)
+    blockchains_repo.insert(Blockchain(BlockchainParameters(0.1, 86400, 100000, ud_time_0=1488987127,
+                                                            ud_reeval_time_0=1490094000, dt_reeval=15778800),
+                                       currency="testcurrency"))
+    # Databases upgraded by the previous migrations were left at version 1
+    with meta_repo.conn:
+        meta_repo.conn.execute("UPDATE meta SET version=1 WHERE id=1")
+    meta_repo.upgrade_database()
+    assert meta_repo.version() == len(meta_repo.upgrades)
+    blockchain = blockchains_repo.get_one(currency="testcurrency")
+    assert blockchain.parameters.ud_time_0 == 1488987127
+    assert blockchain.parameters.ud_reeval_time_0 == 1490094000
+    assert blockchain.parameters.dt_reeval == 15778800
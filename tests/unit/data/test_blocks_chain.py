@@ -0,0 +1,143 @@
+import pytest
+from duniterpy.documents import BlockUID
+from sakia.data.processors import blockchain
+from sakia.data.processors.blockchain import _chained, _with_changes, BlockchainProcessor
+
+
+def blocks_data(start, count, first_previous="PREV"):
+    data = []
+    previous = first_previous
+    for n in range(start, start + count):
+        data.append({'number': n, 'hash': "HASH{0}".format(n), 'previousHash': previous})
+        previous = "HASH{0}".format(n)
+    return data
+
+
+def test_chained_chunks():
+    first = blocks_data(10, 5)
+    assert _chained(first, 10, None)
+    assert _chained(blocks_data(15, 5, "HASH14"), 15, first[-1])
+    assert not _chained(blocks_data(15, 5, "OTHER"), 15, first[-1])
+    assert not _chained(blocks_data(16, 5, "HASH14"), 15, first[-1])
+    assert not _chained([], 15, first[-1])
+
+
+def test_chunk_starting_with_previous_block():
+    local = {'number': 10, 'hash': "HASH10"}
+    assert _chained(blocks_data(10, 5), 10, local)
+    assert not _chained(blocks_data(10, 5), 10, {'number': 10, 'hash': "FORK10"})
+
+
+def test_broken_chunk():
+    data = blocks_data(10, 5)
+    data[3]['previousHash'] = "FAKE"
+    assert not _chained(data, 10, None)
+
+
+def test_pushed_blocks():
+    processor = BlockchainProcessor(None, None, None)
+    for data in blocks_data(11, 3, "HASH10"):
+        data.update({'raw': "", 'signature': ""})
+        processor.receive_block("testcurrency", data)
+    local = {'number': 10, 'hash': "HASH10"}
+    assert [d['number'] for d in processor._pushed_blocks_data("testcurrency", 10, 13, local)] == [11, 12, 13]
+    assert processor._pushed_blocks_data("testcurrency", 10, 14, local) is None
+    assert processor._pushed_blocks_data("testcurrency", 10, 13, {'number': 10, 'hash': "FORK10"}) is None
+
+
+def test_blocks_with_changes():
+    data = blocks_data(10, 3, "HASH9")
+    for block in data:
+        block.update({'joiners': [], 'leavers': [], 'actives': [], 'excluded': [], 'identities': [],
+                      'transactions': [], 'dividend': None})
+    assert not _with_changes(data[0])
+    data[1]['transactions'] = [{'hash': "TX"}]
+    assert _with_changes(data[1])
+    data[2]['dividend'] = 1000
+    assert _with_changes(data[2])
+    # Blocks missing the changes fields are applied
+    assert _with_changes({'number': 13})
+
+
+class FakeHeadersRepo:
+    def insert_all(self, headers):
+        pass
+
+    def get_one(self, currency, number):
+        return None
+
+
+class FakeBmaConnector:
+    """Serves the blocks of the network, and records the requests sent"""
+    def __init__(self, network_blocks, served_blocks=None):
+        self.served = FakeBmaConnector(served_blocks) if served_blocks else self
+        self.network_blocks = {}
+        for data in network_blocks:
+            data.update({'medianTime': 0, 'dividend': None, 'unitbase': 0, 'membersCount': 0, 'monetaryMass': 0})
+            self.network_blocks[data['number']] = data
+        self.requests = []
+
+    async def get(self, currency, request, req_args={}, verify=True):
+        self.requests.append(req_args)
+        if 'count' in req_args:
+            return [self.network_blocks[n] for n in range(req_args['start'], req_args['start'] + req_args['count'])
+                    if n in self.network_blocks]
+        return self.network_blocks.get(req_args['number'])
+
+    async def sharded_get(self, currency, request, req_args_list):
+        return [await self.served.get(currency, request, req_args) for req_args in req_args_list]
+
+
+@pytest.mark.asyncio
+async def test_pushed_blocks_of_a_fork_are_not_used():
+    connector = FakeBmaConnector(blocks_data(10, 4, "HASH9"))
+    processor = BlockchainProcessor(None, FakeHeadersRepo(), connector)
+    for data in blocks_data(11, 3, "HASH10"):
+        data.update({'raw': "", 'signature': "", 'hash': "FORK{0}".format(data['number'])})
+        if data['number'] > 11:
+            data['previousHash'] = "FORK{0}".format(data['number'] - 1)
+        processor.receive_block("testcurrency", data)
+    local = {'number': 10, 'hash': "HASH10"}
+    selected = await processor.next_blocks_data(10, [13], "testcurrency", local, BlockUID(13, "HASH13"))
+    assert [d['hash'] for d in selected] == ["HASH11", "HASH12", "HASH13"]
+
+
+@pytest.mark.asyncio
+async def test_pushed_blocks_of_the_network_are_used():
+    connector = FakeBmaConnector([])
+    processor = BlockchainProcessor(None, FakeHeadersRepo(), connector)
+    for data in FakeBmaConnector(blocks_data(11, 3, "HASH10")).network_blocks.values():
+        data.update({'raw': "", 'signature': ""})
+        processor.receive_block("testcurrency", data)
+    local = {'number': 10, 'hash': "HASH10"}
+    selected = await processor.next_blocks_data(10, [13], "testcurrency", local, BlockUID(13, "HASH13"))
+    assert [d['hash'] for d in selected] == ["HASH11", "HASH12", "HASH13"]
+    assert connector.requests == []
+
+
+@pytest.mark.asyncio
+async def test_forged_window_is_not_used():
+    forged = blocks_data(10, 4, "HASH9")
+    for data in forged[1:]:
+        data['hash'] = "FORGED{0}".format(data['number'])
+        if data['number'] > 11:
+            data['previousHash'] = "FORGED{0}".format(data['number'] - 1)
+    connector = FakeBmaConnector(blocks_data(10, 4, "HASH9"), forged)
+    processor = BlockchainProcessor(None, FakeHeadersRepo(), connector)
+    local = {'number': 10, 'hash': "HASH10"}
+    selected = await processor.next_blocks_data(10, [13], "testcurrency", local, BlockUID(13, "HASH13"))
+    assert [d['hash'] for d in selected] == ["HASH11", "HASH12", "HASH13"]
+
+
+@pytest.mark.asyncio
+async def test_timestamps_are_bounded(monkeypatch):
+    monkeypatch.setattr(blockchain, "TIMESTAMPS", 2)
+    connector = FakeBmaConnector(blocks_data(10, 3))
+    processor = BlockchainProcessor(None, FakeHeadersRepo(), connector)
+    for number in (10, 11, 10, 12):
+        await processor.timestamp("testcurrency", number)
+    assert len(connector.requests) == 3
+    # Block 11 was the least recently used
+    await processor.timestamp("testcurrency", 10)
+    await processor.timestamp("testcurrency", 11)
+    assert len(connector.requests) == 4
@@ -0,0 +1,25 @@
+from duniterpy.api import bma
+from sakia.data.connectors.bma import canonical_digest, VOLATILE_FIELDS
+
+
+def test_digest_ignores_order():
+    first = {"result": {"blocks": [1, 5, 12]}, "currency": "testcurrency"}
+    second = {"currency": "testcurrency", "result": {"blocks": [12, 1, 5]}}
+    assert canonical_digest(first) == canonical_digest(second)
+    assert canonical_digest(first) != canonical_digest({"currency": "testcurrency", "result": {"blocks": [1, 5]}})
+
+
+def test_digest_skips_volatile_fields():
+    first = {"identities": [{"uid": "doe",
+                             "certifications": [{"from": "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                                                 "expiresIn": 1200}],
+                             "membershipPendingExpiresIn": 30}]}
+    second = {"identities": [{"uid": "doe",
+                              "certifications": [{"from": "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                                                  "expiresIn": 1185}],
+                              "membershipPendingExpiresIn": 15}]}
+    volatile = VOLATILE_FIELDS[bma.wot.requirements]
+    assert canonical_digest(first, volatile) == canonical_digest(second, volatile)
+    assert canonical_digest(first) != canonical_digest(second)
+    # The data is not modified
+    assert first["identities"][0]["membershipPendingExpiresIn"] == 30
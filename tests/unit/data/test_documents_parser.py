@@ -0,0 +1,66 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pytest
+from duniterpy.documents import Peer
+from sakia.data.parser import DocumentsParser, PeersVerifier
+
+PEER_RAW = """Version: 2
+Type: Peer
+Currency: meta_brouzouf
+PublicKey: 8Fi1VSTbjkXguwThF4v2ZxC5whK7pwG2vcGTkPUPjPGU
+Block: 48698-000005E0F228038E4DDD4F6CA4ACB01EC88FBAF8
+Endpoints:
+BASIC_MERKLED_API duniter.inso.ovh 80
+82o1sNCh1bLpUXU6nacbK48HBcA9Eu2sPkL1/3c2GtDPxBUZd2U2sb7DxwJ54n6ce9G0Oy7nd1hCxN3fS0oADw==
+"""
+
+
+def raise_out_of(pid):
+    if os.getpid() != pid:
+        raise TypeError("Malformed document")
+    return pid
+
+
+@pytest.mark.asyncio
+async def test_parse_peers():
+    parser = DocumentsParser(ThreadPoolExecutor(max_workers=1))
+    peers = await parser.parse_peers([PEER_RAW, "Version: 2\nType: Peer\n"])
+    assert peers[0].pubkey == "8Fi1VSTbjkXguwThF4v2ZxC5whK7pwG2vcGTkPUPjPGU"
+    assert peers[0].endpoints[0].inline() == "BASIC_MERKLED_API duniter.inso.ovh 80"
+    assert peers[1] is None
+    parser.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_unpicklable_arguments_are_parsed_in_a_thread():
+    parser = DocumentsParser(ProcessPoolExecutor(max_workers=1))
+    assert await parser.run(len, [lambda: None]) == 1
+    parser.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_errors_of_the_parsing_processes_are_raised():
+    parser = DocumentsParser(ProcessPoolExecutor(max_workers=1))
+    # The error is not taken for a pickling error : the document is not parsed again in a thread
+    with pytest.raises(TypeError):
+        await parser.run(raise_out_of, os.getpid())
+    parser.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_verify_peers_by_batches():
+    batches = []
+
+    class FakeParser:
+        async def verify_peers(self, peers):
+            batches.append(peers)
+            return [True for _ in peers]
+
+    verifier = PeersVerifier(FakeParser(), window=0.01)
+    peer = Peer.from_signed_raw(PEER_RAW)
+    results = await asyncio.gather(*[verifier.verify(peer) for _ in range(3)])
+    assert results == [True, True, True]
+    assert len(batches) == 1 and len(batches[0]) == 1
+    assert await verifier.verify(Peer.from_signed_raw(PEER_RAW))
+    assert len(batches) == 1
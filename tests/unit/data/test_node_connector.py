@@ -1,5 +1,10 @@
+import asyncio
+import pytest
 from duniterpy.documents import Peer
 from sakia.data.connectors import NodeConnector
+from sakia.data.connectors import node as node_module
+from sakia.data.connectors.node import LEAVES_CONCURRENCY, BULK_LEAVES
+from sakia.data.entities import UserParameters
 
 
 def test_from_peer():
@@ -16,3 +21,99 @@ BASIC_MERKLED_API duniter.inso.ovh 80
     assert connector.node.pubkey == "8Fi1VSTbjkXguwThF4v2ZxC5whK7pwG2vcGTkPUPjPGU"
     assert connector.node.endpoints[0].inline() == "BASIC_MERKLED_API duniter.inso.ovh 80"
     assert connector.node.currency == "meta_brouzouf"
+
+
+@pytest.mark.asyncio
+async def test_request_leaves_bounded():
+    peer = Peer.from_signed_raw("""Version: 2
+Type: Peer
+Currency: meta_brouzouf
+PublicKey: 8Fi1VSTbjkXguwThF4v2ZxC5whK7pwG2vcGTkPUPjPGU
+Block: 48698-000005E0F228038E4DDD4F6CA4ACB01EC88FBAF8
+Endpoints:
+BASIC_MERKLED_API duniter.inso.ovh 80
+82o1sNCh1bLpUXU6nacbK48HBcA9Eu2sPkL1/3c2GtDPxBUZd2U2sb7DxwJ54n6ce9G0Oy7nd1hCxN3fS0oADw==
+""")
+    connector = NodeConnector.from_peer('meta_brouzouf', peer, None)
+    connector._user_parameters = UserParameters()
+    running = []
+    max_running = []
+    received = []
+
+    async def safe_request(endpoint, request, proxy, req_args={}):
+        running.append(req_args['leaf'])
+        max_running.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(req_args['leaf'])
+        if req_args['leaf'] == "leaf0":
+            return None
+        if req_args['leaf'] == "leaf1":
+            return {'leaf': {'value': {'raw': "Version: 2\nType: Peer\n", 'signature': ""}}}
+        return {'leaf': {'value': {'raw': peer.raw(), 'signature': peer.signatures[0]}}}
+
+    connector.safe_request = safe_request
+    connector.neighbour_found.connect(received.append)
+    leaves = ["leaf{0}".format(i) for i in range(LEAVES_CONCURRENCY * 3)]
+    obtained = await connector.request_leaves(connector.node.endpoints[0], leaves)
+    # Missing and malformed leaves are not obtained, the other leaves are still requested
+    assert obtained == set(leaves[2:])
+    assert len(received) == len(leaves) - 2
+    assert max(max_running) == LEAVES_CONCURRENCY
+
+
+@pytest.mark.asyncio
+async def test_stop_websockets_during_handshake():
+    peer = Peer.from_signed_raw("""Version: 2
+Type: Peer
+Currency: meta_brouzouf
+PublicKey: 8Fi1VSTbjkXguwThF4v2ZxC5whK7pwG2vcGTkPUPjPGU
+Block: 48698-000005E0F228038E4DDD4F6CA4ACB01EC88FBAF8
+Endpoints:
+BASIC_MERKLED_API duniter.inso.ovh 80
+82o1sNCh1bLpUXU6nacbK48HBcA9Eu2sPkL1/3c2GtDPxBUZd2U2sb7DxwJ54n6ce9G0Oy7nd1hCxN3fS0oADw==
+""")
+    connector = NodeConnector.from_peer('meta_brouzouf', peer, None)
+    handshake = asyncio.ensure_future(asyncio.sleep(10))
+    connector._ws_tasks['block'] = handshake
+    connector.stop_websockets()
+    await asyncio.sleep(0)
+    # The websocket is not connected yet, it is still stopped
+    assert handshake.cancelled()
+    assert not connector.use_websockets
+
+
+@pytest.mark.asyncio
+async def test_request_peers_bulk_records_received_peers(monkeypatch):
+    peer = Peer.from_signed_raw("""Version: 2
+Type: Peer
+Currency: meta_brouzouf
+PublicKey: 8Fi1VSTbjkXguwThF4v2ZxC5whK7pwG2vcGTkPUPjPGU
+Block: 48698-000005E0F228038E4DDD4F6CA4ACB01EC88FBAF8
+Endpoints:
+BASIC_MERKLED_API duniter.inso.ovh 80
+82o1sNCh1bLpUXU6nacbK48HBcA9Eu2sPkL1/3c2GtDPxBUZd2U2sb7DxwJ54n6ce9G0Oy7nd1hCxN3fS0oADw==
+""")
+    connector = NodeConnector.from_peer('meta_brouzouf', peer, None)
+    connector._user_parameters = UserParameters()
+    leaves = [peer.sha_hash] + ["leaf{0}".format(i) for i in range(BULK_LEAVES)]
+    requested = []
+
+    async def safe_request(endpoint, request, proxy, req_args={}):
+        if 'leaf' in req_args:
+            requested.append(req_args['leaf'])
+            return None
+        return {'root': "ROOT", 'leaves': leaves}
+
+    async def all_peers(connection):
+        return {'peers': [{'version': 2, 'currency': "meta_brouzouf", 'pubkey': peer.pubkey,
+                           'block': str(peer.blockUID), 'endpoints': [e.inline() for e in peer.endpoints],
+                           'signature': peer.signatures[0]},
+                          {'version': 2}]}
+
+    monkeypatch.setattr(node_module, "all_peers", all_peers)
+    connector.safe_request = safe_request
+    await connector.request_peers()
+    # The leaves missing from the peers list are requested one by one, the root is unknown until they are obtained
+    assert requested == leaves[1:]
+    assert connector.node.merkle_peers_leaves == (peer.sha_hash,)
+    assert connector.node.merkle_peers_root != "ROOT"
@@ -0,0 +1,74 @@
+import time
+from sakia.data.repositories import NodesRepo, NodesRegistry
+from sakia.data.processors import NodesProcessor
+from sakia.data.processors.nodes import WARM_START_AGE
+from sakia.data.entities import Node
+from duniterpy.documents import BlockUID
+
+
+def test_registry_indexes_and_flushes(meta_repo):
+    nodes_repo = NodesRepo(meta_repo.conn)
+    nodes_repo.insert(Node("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                           "BASIC_MERKLED_API test.duniter.org 80", BlockUID.empty(),
+                           state=Node.ONLINE, member=True))
+    registry = NodesRegistry(nodes_repo)
+    registry.load()
+    registry.insert(Node("testcurrency", "FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn",
+                         "BASIC_MERKLED_API other.duniter.org 80", BlockUID.empty(),
+                         state=Node.ONLINE, member=False))
+    assert len(registry.get_all(currency="testcurrency", state=Node.ONLINE)) == 2
+    assert len(registry.get_all(currency="testcurrency", state=Node.ONLINE, member=True)) == 1
+
+    node = registry.get_one(currency="testcurrency", pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ")
+    node.state = Node.OFFLINE
+    # The registry only knows the changes it is updated with
+    assert len(registry.get_all(currency="testcurrency", state=Node.ONLINE)) == 2
+    registry.update(node)
+    assert len(registry.get_all(currency="testcurrency", state=Node.ONLINE)) == 1
+
+    registry.flush()
+    assert nodes_repo.get_one(pubkey="FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn") is not None
+    assert nodes_repo.get_one(pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ").state == Node.OFFLINE
+
+    registry.drop(node)
+    registry.flush()
+    assert nodes_repo.get_one(pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ") is None
+
+
+def test_registry_flushes_health_only(meta_repo):
+    nodes_repo = NodesRepo(meta_repo.conn)
+    nodes_repo.insert(Node("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                           "BASIC_MERKLED_API test.duniter.org 80", BlockUID.empty(),
+                           state=Node.ONLINE, member=True))
+    registry = NodesRegistry(nodes_repo)
+    registry.load()
+    node = registry.get_one(currency="testcurrency", pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ")
+    node.state = Node.OFFLINE
+    registry.update_health("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ", 120, 0.25, 1488019194)
+    registry.flush()
+    stored = nodes_repo.get_one(pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ")
+    # Only the health is written, the node was not updated
+    assert (stored.latency, stored.error_rate, stored.last_limitation) == (120, 0.25, 1488019194)
+    assert stored.state == Node.ONLINE
+
+
+def test_warm_start_orders_recent_nodes_first(meta_repo):
+    now = int(time.time())
+    nodes_repo = NodesRepo(meta_repo.conn)
+    nodes_repo.insert(Node("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                           "BASIC_MERKLED_API old.duniter.org 80", BlockUID.empty(),
+                           state=Node.ONLINE, last_success=now - WARM_START_AGE - 60))
+    nodes_repo.insert(Node("testcurrency", "FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn",
+                           "BASIC_MERKLED_API slow.duniter.org 80", BlockUID.empty(),
+                           state=Node.ONLINE, latency=900, last_success=now - 60))
+    nodes_repo.insert(Node("testcurrency", "HnFcSms8jzwngtVomTTnzudZx7SHUQY8sVE1y8yBmULk",
+                           "BASIC_MERKLED_API fast.duniter.org 80", BlockUID.empty(),
+                           state=Node.ONLINE, latency=100, last_success=now - 60))
+    registry = NodesRegistry(nodes_repo)
+    registry.load()
+    nodes = NodesProcessor(registry).warm_start("testcurrency")
+    assert [n.pubkey[:4] for n in nodes] == ["HnFc", "FADx", "7Aqw"]
+    assert nodes[2].state == Node.OFFLINE
+    registry.flush()
+    assert nodes_repo.get_one(pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ").state == Node.OFFLINE
+    assert nodes_repo.get_one(pubkey="FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn").last_success == now - 60
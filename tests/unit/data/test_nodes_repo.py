@@ -92,3 +92,20 @@ UNKNOWNAPI some useless information""",
     node2 = nodes_repo.get_one(pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ")
     assert node2.current_buid == block_uid("16-77543400E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67")
     assert node2.previous_buid == block_uid("15-76543400E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67")
+
+
+def test_update_node_health(meta_repo):
+    nodes_repo = NodesRepo(meta_repo.conn)
+    node = Node("testcurrency",
+                "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                "BASIC_MERKLED_API testnet.duniter.org 80",
+                BlockUID.empty())
+    nodes_repo.insert(node)
+    nodes_repo.update_health("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ", 120, 0.25, 1488019194)
+    node.state = Node.ONLINE
+    nodes_repo.update(node)
+    node2 = nodes_repo.get_one(pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ")
+    assert node2.state == Node.ONLINE
+    assert node2.latency == 120
+    assert node2.error_rate == 0.25
+    assert node2.last_limitation == 1488019194
@@ -0,0 +1,22 @@
+from duniterpy.documents import BlockUID
+from sakia.data.connectors.limiter import RateLimiter, BURST, MAX_RATE
+from sakia.data.entities import Node
+
+
+def test_limitation_throttles_node():
+    node = Node("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                "BASIC_MERKLED_API test.duniter.org 80", BlockUID.empty())
+    other = Node("testcurrency", "FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn",
+                 "BASIC_MERKLED_API other.duniter.org 80", BlockUID.empty())
+    limiter = RateLimiter()
+    assert limiter.available(node)
+
+    limiter.limitation(node)
+    assert not limiter.available(node)
+    assert limiter.bucket(node).rate == MAX_RATE / 2
+    assert limiter.bucket(node).tokens <= -BURST + 1
+    assert limiter.available(other)
+
+    for i in range(0, 100):
+        limiter.success(node)
+    assert limiter.bucket(node).rate == MAX_RATE
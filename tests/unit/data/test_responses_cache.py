@@ -0,0 +1,47 @@
+from duniterpy.api import bma
+from duniterpy.documents import block_uid
+from sakia.data.connectors.cache import ResponsesCache
+
+
+def test_block_relative_answer_expires_on_new_block():
+    cache = ResponsesCache()
+    buid = block_uid("10-000031D0C7F53E4D8E35CAD22A11EAA99232F7FC79A2C12F25BF46330136FDB8")
+    assert cache.get("testcurrency", bma.blockchain.ud, {}, buid) is None
+    cache.put("testcurrency", bma.blockchain.ud, {}, buid, {"result": {"blocks": [2, 5]}})
+    assert cache.get("testcurrency", bma.blockchain.ud, {}, buid) == {"result": {"blocks": [2, 5]}}
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+    new_buid = block_uid("11-00000A4B2BA5C0E67B4A44F9A8A5B31F4A0B4E42B3BFAC84D2C1E0F2ED1C2B3A")
+    assert cache.get("testcurrency", bma.blockchain.ud, {}, new_buid) is None
+    assert cache.size == 0
+
+
+def test_immutable_answer_kept_until_fork():
+    cache = ResponsesCache()
+    buid = block_uid("200-000031D0C7F53E4D8E35CAD22A11EAA99232F7FC79A2C12F25BF46330136FDB8")
+    cache.put("testcurrency", bma.blockchain.block, {'number': 50}, buid, {"number": 50})
+    cache.get("testcurrency", bma.blockchain.block, {'number': 50}, buid)
+    cache.put("testcurrency", bma.blockchain.block, {'number': 50}, buid, {"number": 50})
+    cache.put("testcurrency", bma.blockchain.block, {'number': 150}, buid, {"number": 150})
+
+    new_buid = block_uid("201-00000A4B2BA5C0E67B4A44F9A8A5B31F4A0B4E42B3BFAC84D2C1E0F2ED1C2B3A")
+    assert cache.get("testcurrency", bma.blockchain.block, {'number': 50}, new_buid) == {"number": 50}
+    assert cache.get("testcurrency", bma.blockchain.block, {'number': 150}, new_buid) == {"number": 150}
+
+    forked_buid = block_uid("201-0000FFFF2BA5C0E67B4A44F9A8A5B31F4A0B4E42B3BFAC84D2C1E0F2ED1C2B3A")
+    assert cache.get("testcurrency", bma.blockchain.block, {'number': 50}, forked_buid) == {"number": 50}
+    assert cache.get("testcurrency", bma.blockchain.block, {'number': 150}, forked_buid) is None
+
+
+def test_lru_eviction():
+    cache = ResponsesCache(max_size=40)
+    buid = block_uid("10-000031D0C7F53E4D8E35CAD22A11EAA99232F7FC79A2C12F25BF46330136FDB8")
+    cache.get("testcurrency", bma.blockchain.ud, {}, buid)
+    cache.put("testcurrency", bma.wot.lookup, {'search': "john"}, buid, {"uid": "john"})
+    cache.put("testcurrency", bma.wot.lookup, {'search': "doe"}, buid, {"uid": "doe"})
+    cache.get("testcurrency", bma.wot.lookup, {'search': "john"}, buid)
+    cache.put("testcurrency", bma.wot.lookup, {'search': "alice"}, buid, {"uid": "alice"})
+    assert cache.get("testcurrency", bma.wot.lookup, {'search': "john"}, buid) == {"uid": "john"}
+    assert cache.get("testcurrency", bma.wot.lookup, {'search': "doe"}, buid) is None
+    assert cache.size <= 40
@@ -0,0 +1,23 @@
+from duniterpy.documents import BlockUID
+from sakia.data.connectors.scores import Scoreboard
+from sakia.data.entities import Node
+
+
+def test_fast_nodes_come_first():
+    fast = Node("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                "BASIC_MERKLED_API fast.duniter.org 80", BlockUID.empty())
+    slow = Node("testcurrency", "FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn",
+                "BASIC_MERKLED_API slow.duniter.org 80", BlockUID.empty(), latency=1500)
+    scoreboard = Scoreboard()
+    for i in range(0, 5):
+        scoreboard.success(fast, 50)
+        scoreboard.failure(slow)
+
+    first_nodes = [scoreboard.order([slow, fast])[0] for i in range(0, 1000)]
+    assert first_nodes.count(fast) > 850
+    # Slow nodes are still explored
+    assert first_nodes.count(slow) > 0
+
+    changed = scoreboard.pop_changed()
+    assert ("testcurrency", fast.pubkey) in [(c, p) for c, p, s in changed]
+    assert scoreboard.pop_changed() == []
@@ -0,0 +1,39 @@
+from sakia.services.consensus import ConsensusTracker
+from sakia.data.entities import Node
+
+
+class FakeNode:
+    def __init__(self, pubkey, sha_hash, state=Node.ONLINE):
+        self.pubkey = pubkey
+        self.state = state
+        self.current_buid = type("BlockUID", (), {"sha_hash": sha_hash})()
+
+
+def test_majority_follows_votes():
+    tracker = ConsensusTracker()
+    nodes = [FakeNode("a", "H1"), FakeNode("b", "H1"), FakeNode("c", "H2")]
+    assert tracker.reset(nodes) == {"a", "b", "c"}
+    assert tracker.majority == "H1"
+    assert tracker.state("c") == Node.DESYNCED
+
+    assert tracker.update(FakeNode("c", "H1")) == {"c"}
+    assert tracker.state("c") == Node.ONLINE
+
+    tracker.update(FakeNode("a", "H3"))
+    assert tracker.majority == "H1"
+    affected = tracker.update(FakeNode("b", "H3"))
+    assert tracker.majority == "H3"
+    assert affected == {"a", "b", "c"}
+
+
+def test_offline_nodes_do_not_vote():
+    tracker = ConsensusTracker()
+    tracker.reset([FakeNode("a", "H1"), FakeNode("b", "H2"), FakeNode("c", "H2")])
+    assert tracker.majority == "H2"
+    tracker.update(FakeNode("b", "H2", state=Node.OFFLINE))
+    assert tracker.state("b") is None
+    tracker.withdraw("c")
+    assert tracker.majority == "H1"
+    assert tracker.state("a") == Node.ONLINE
+    tracker.withdraw("a")
+    assert tracker.majority is None
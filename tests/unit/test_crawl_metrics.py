@@ -0,0 +1,23 @@
+from sakia.crawl import CrawlMetrics
+from sakia.data.connectors.traffic import TrafficStats
+
+
+def test_time_to_stable_consensus():
+    metrics = CrawlMetrics(start=100, stable_delay=10)
+    metrics.observe(None, 101)
+    metrics.observe("H1", 102)
+    metrics.observe("H1", 105)
+    metrics.observe("H2", 106)
+    metrics.observe("H2", 115)
+    assert not metrics.stable()
+    metrics.observe("H2", 116)
+    assert metrics.stable()
+    # A later change of block does not change the time to reach the first stable consensus
+    metrics.observe("H3", 120)
+    metrics.node_found()
+    metrics.node_found()
+    report = metrics.report(120, TrafficStats(requests=5, bytes_received=1000), 3, 2)
+    assert report["time_to_stable_consensus"] == 6
+    assert report["nodes_discovered_per_second"] == 0.1
+    assert report["requests"] == 5
+    assert report["majority_block"] == "H3"
@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+from sakia.services.crawler import Crawler, Schedule, MIN_INTERVAL
+
+
+class FakeConnector:
+    def __init__(self, pubkey):
+        self.node = type("Node", (), {"pubkey": pubkey, "state": 1, "current_buid": 0})()
+
+
+def test_schedule_adapts_to_changes():
+    schedule = Schedule()
+    schedule.refreshed((1, 10), 0)
+    assert schedule.interval == MIN_INTERVAL
+    schedule.refreshed((1, 10), 0)
+    assert schedule.interval == MIN_INTERVAL * 2
+    schedule.refreshed((1, 10), 0)
+    schedule.refreshed((1, 11), 100)
+    assert schedule.interval == MIN_INTERVAL * 2
+    assert schedule.next_refresh == 100 + MIN_INTERVAL * 2
+
+
+@pytest.mark.asyncio
+async def test_crawl_bounds_concurrency():
+    crawler = Crawler(concurrency=3, deadline=10)
+    connectors = [FakeConnector(str(i)) for i in range(10)]
+    running = []
+    max_running = []
+
+    async def refresh(connector, timeout):
+        running.append(connector)
+        max_running.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(connector)
+
+    await crawler.crawl(connectors, refresh)
+    assert max(max_running) == 3
+    assert len(max_running) == 10
+    assert crawler.due(connectors, 0) == []
+
+
+@pytest.mark.asyncio
+async def test_crawl_backs_off_failing_nodes():
+    crawler = Crawler(concurrency=2, deadline=10)
+    connectors = [FakeConnector(str(i)) for i in range(4)]
+
+    async def refresh(connector, timeout):
+        await asyncio.sleep(0.01)
+        if connector.node.pubkey == "0":
+            raise ValueError("Unexpected reply")
+
+    await crawler.crawl(connectors, refresh)
+    assert crawler.schedule(connectors[0]).interval == MIN_INTERVAL * 2
+    assert all(crawler.schedule(c).fingerprint is not None for c in connectors[1:])
+    assert crawler.due(connectors, 0) == []
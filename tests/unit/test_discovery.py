@@ -0,0 +1,31 @@
+from sakia.services.discovery import DiscoveryQueue, UNKNOWN_NODE, MEMBER_NODE, OTHER_NODE
+
+
+class FakePeer:
+    def __init__(self, pubkey, block):
+        self.pubkey = pubkey
+        self.blockUID = block
+
+
+def test_priorities():
+    queue = DiscoveryQueue()
+    queue.push(FakePeer("other", 1), OTHER_NODE)
+    queue.push(FakePeer("member", 1), MEMBER_NODE)
+    queue.push(FakePeer("unknown", 1), UNKNOWN_NODE)
+    assert [p.pubkey for p in queue.pop_batch(2)] == ["unknown", "member"]
+    assert [p.pubkey for p in queue.pop_batch(2)] == ["other"]
+    assert queue.pop_batch(2) == []
+
+
+def test_dedup_by_blockstamp():
+    queue = DiscoveryQueue(max_peers=2)
+    assert queue.push(FakePeer("a", 2), OTHER_NODE)
+    assert not queue.push(FakePeer("a", 2), OTHER_NODE)
+    assert not queue.push(FakePeer("a", 1), OTHER_NODE)
+    assert queue.push(FakePeer("a", 3), OTHER_NODE)
+    assert queue.push(FakePeer("b", 1), OTHER_NODE)
+    assert not queue.push(FakePeer("c", 1), UNKNOWN_NODE)
+    assert len(queue) == 2
+    batch = queue.pop_batch(10)
+    assert [(p.pubkey, p.blockUID) for p in batch] == [("a", 3), ("b", 1)]
+    assert len(queue) == 0
@@ -0,0 +1,43 @@
+import asyncio
+import pytest
+from sakia.services.pipeline import Pipeline
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runs_batches_in_order():
+    batches = [[1, 2], [3], [4, 5, 6]]
+    applied = []
+
+    async def produce():
+        return batches.pop(0) if batches else None
+
+    async def double(batch):
+        await asyncio.sleep(0)
+        return [n * 2 for n in batch]
+
+    async def apply(batch):
+        applied.extend(batch)
+
+    pipeline = Pipeline([("produce", produce), ("double", double), ("apply", apply)], 1)
+    await pipeline.run()
+    assert applied == [2, 4, 6, 8, 10, 12]
+    assert [m.items for m in pipeline.metrics] == [6, 6, 6]
+    assert [m.batches for m in pipeline.metrics] == [3, 3, 3]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_applies_batches_before_error():
+    batches = [[1], [2]]
+    applied = []
+
+    async def produce():
+        if batches:
+            return batches.pop(0)
+        raise ValueError("network")
+
+    async def apply(batch):
+        applied.extend(batch)
+
+    with pytest.raises(ValueError):
+        await Pipeline([("produce", produce), ("apply", apply)]).run()
+    assert applied == [1, 2]
@@ -0,0 +1,39 @@
+from sakia.services.websockets import WebsocketsBudget
+from sakia.data.entities import Node
+from sakia.data.connectors.scores import Scoreboard
+
+
+class FakeConnector:
+    def __init__(self, pubkey, state=Node.ONLINE, member=False, latency=0):
+        self.node = Node("testcurrency", pubkey, (), "0-E3B0C44298FC1C149AFBF4C8996FB92427AE41E4649B934CA495991B7852B855",
+                         state=state, member=member, latency=latency)
+        self.use_websockets = True
+
+    def stop_websockets(self):
+        self.use_websockets = False
+
+
+def test_best_nodes_are_listened():
+    connectors = [FakeConnector("offline", state=Node.OFFLINE),
+                  FakeConnector("slow", latency=900),
+                  FakeConnector("fast", latency=50),
+                  FakeConnector("member", member=True, latency=1000)]
+    best = WebsocketsBudget(2).assign(connectors)
+    assert [c.node.pubkey for c in best] == ["member", "fast"]
+    assert [c.node.pubkey for c in connectors if c.use_websockets] == ["fast", "member"]
+
+
+def test_listened_nodes_are_kept():
+    connectors = [FakeConnector("a", latency=100), FakeConnector("b", latency=50)]
+    connectors[1].use_websockets = False
+    WebsocketsBudget(1).assign(connectors)
+    assert [c.node.pubkey for c in connectors if c.use_websockets] == ["a"]
+
+
+def test_nodes_are_ranked_on_their_current_health():
+    connectors = [FakeConnector("a", latency=50), FakeConnector("b", latency=100)]
+    scores = Scoreboard()
+    for _ in range(5):
+        scores.failure(connectors[0].node)
+    best = WebsocketsBudget(1, scores).assign(connectors)
+    assert [c.node.pubkey for c in best] == ["b"]